@@ -1,14 +1,36 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, Response, abort, g, has_request_context, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import os
-from io import BytesIO
+import re
+import json
+import queue
+import hashlib
+import tempfile
+import click
+import threading
+import time
+import atexit
+import fcntl
+import gzip
+import glob
+import hmac
+import zipfile
+import multiprocessing
+import csv
+import math
+import bisect
+import gc
+import unicodedata
+from io import StringIO
 from dotenv import load_dotenv
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table as ReportTable, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Load environment variables
@@ -18,7 +40,10 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
 
 # Database configuration
-if os.getenv('RAILWAY_ENVIRONMENT'):
+if os.getenv('SQLALCHEMY_DATABASE_URI'):
+    # Explicit override, e.g. a scratch database for the benchmarks
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
+elif os.getenv('RAILWAY_ENVIRONMENT'):
     # Use PostgreSQL on Railway
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 else:
@@ -30,6 +55,32 @@ if app.config['SQLALCHEMY_DATABASE_URI'] and app.config['SQLALCHEMY_DATABASE_URI
     app.config['SQLALCHEMY_DATABASE_URI'] = app.config['SQLALCHEMY_DATABASE_URI'].replace('postgres://', 'postgresql://', 1)
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Write each activity log entry in the request instead of batching it (useful in tests)
+app.config['ACTIVITY_LOG_SYNC'] = os.getenv('ACTIVITY_LOG_SYNC', '').lower() in ('1', 'true', 'yes')
+
+# Gunicorn worker model; gunicorn.conf.py reads the same variables
+WORKER_CLASS = os.getenv('WEB_WORKER_CLASS', 'gthread')
+WORKER_THREADS = int(os.getenv('WEB_THREADS', 16))
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', 2))
+# Connections used outside requests: report renderers, the activity log writer and retention
+BACKGROUND_CONNECTIONS = REPORT_WORKERS + 2
+
+def engine_options(uri):
+    """Connection pool sized for the worker model, so requests don't queue for a connection"""
+    if uri == 'sqlite://' or ':memory:' in uri:
+        return {}  # In-memory SQLite shares a single connection
+    if os.getenv('DB_POOL_SIZE'):
+        pool_size = int(os.getenv('DB_POOL_SIZE'))
+    elif WORKER_CLASS == 'gthread':
+        pool_size = WORKER_THREADS  # One per request thread
+    elif WORKER_CLASS == 'gevent':
+        # Thousands of greenlets, mostly waiting on streams that hold no connection; the rest queue here
+        pool_size = 10
+    else:
+        pool_size = 1  # Sync workers serve one request at a time
+    return {'pool_size': pool_size, 'max_overflow': BACKGROUND_CONNECTIONS, 'pool_timeout': 30}
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 db = SQLAlchemy(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -47,6 +98,59 @@ class Table(db.Model):
     name = db.Column(db.String(50), nullable=False)
     owner = db.Column(db.String(20), nullable=False)  # 'ayoub' or 'ayman'
 
+class Customer(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # Display spelling, copied onto game records
+    key = db.Column(db.String(100), nullable=False, unique=True, index=True)  # normalize_customer_name(name)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+def normalize_customer_name(name):
+    """Matching key for a customer name: case, accents and extra spaces don't matter"""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    without_accents = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(without_accents.casefold().split())
+
+CachedTable = namedtuple('CachedTable', ['id', 'name', 'owner', 'tariff'])
+
+class TableRegistry:
+    """Process-wide copy of the club's tables, keyed by id and by owner"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = None
+        self._by_owner = None
+
+    def _load(self):
+        with self._lock:
+            if self._by_id is None:
+                tables = [CachedTable(table.id, table.name, table.owner, tariff_for_name(table.name))
+                          for table in Table.query.order_by(Table.id).all()]
+                by_owner = {}
+                for table in tables:
+                    by_owner.setdefault(table.owner, []).append(table)
+                self._by_owner = by_owner
+                self._by_id = {table.id: table for table in tables}
+            return self._by_id, self._by_owner
+
+    def get(self, table_id):
+        by_id = self._by_id
+        if by_id is None:
+            by_id, _ = self._load()
+        return by_id.get(int(table_id))
+
+    def for_owner(self, owner):
+        by_owner = self._by_owner
+        if by_owner is None:
+            _, by_owner = self._load()
+        return list(by_owner.get(owner, []))
+
+    def invalidate(self):
+        with self._lock:
+            self._by_id = None
+            self._by_owner = None
+
+table_registry = TableRegistry()
+
 class GameRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     table_id = db.Column(db.Integer, db.ForeignKey('table.id'), nullable=False)
@@ -56,9 +160,23 @@ class GameRecord(db.Model):
     payment_status = db.Column(db.String(20), nullable=False, default='loan')
     state = db.Column(db.String(20), nullable=False, default='inprogress')
     customer_name = db.Column(db.String(100))
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), index=True)
     created_by = db.Column(db.String(80), nullable=False)
     confirmed = db.Column(db.Boolean, default=False)
-    archived = db.Column(db.Boolean, default=False)
+    archived = db.Column(db.Boolean, default=False)  # Legacy flag: archived games now move to game_record_history
+
+    __table_args__ = (
+        # Active games: /api/active_games, new_record and end_game only look at open games
+        db.Index('ix_game_record_inprogress', 'table_id',
+                 sqlite_where=db.text("state = 'inprogress'"),
+                 postgresql_where=db.text("state = 'inprogress'")),
+        # Per-owner reads join through table_id, then filter on confirmed and the day
+        db.Index('ix_game_record_table_day', 'table_id', 'confirmed', 'start_time'),
+        # Invoices and loan payments look up a single customer
+        db.Index('ix_game_record_customer_status', 'customer_name', 'payment_status'),
+        # Daily reports and reset_day filter on a start_time range
+        db.Index('ix_game_record_confirmed_day', 'confirmed', 'start_time'),
+    )
 
 class UserActivity(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -67,47 +185,1286 @@ class UserActivity(db.Model):
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.now)
     details = db.Column(db.String(500))
 
+    __table_args__ = (
+        # Newest-first reads, globally and per user, with id breaking timestamp ties
+        db.Index('ix_user_activity_time', 'timestamp', 'id'),
+        db.Index('ix_user_activity_user_time', 'user_id', 'timestamp', 'id'),
+    )
+
+class GameRecordHistory(db.Model):
+    """Games moved out of game_record by reset_day, kept for reports that need history"""
+    __tablename__ = 'game_record_history'
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, nullable=False)  # id the game had in game_record
+    table_id = db.Column(db.Integer, db.ForeignKey('table.id'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime)
+    price = db.Column(db.Float, nullable=False, default=0)
+    payment_status = db.Column(db.String(20), nullable=False)
+    state = db.Column(db.String(20), nullable=False)
+    customer_name = db.Column(db.String(100))
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), index=True)
+    created_by = db.Column(db.String(80), nullable=False)
+    confirmed = db.Column(db.Boolean, default=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_game_record_history_table_start', 'table_id', 'start_time'),
+        db.Index('ix_game_record_history_customer', 'customer_name', 'start_time'),
+    )
+
+class DailySummary(db.Model):
+    """Per table and day rollup of confirmed games, written when reset_day closes a day"""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    owner = db.Column(db.String(20), nullable=False)
+    table_id = db.Column(db.Integer, db.ForeignKey('table.id'), nullable=False)
+    paid_total = db.Column(db.Float, nullable=False, default=0)
+    loan_total = db.Column(db.Float, nullable=False, default=0)
+    game_count = db.Column(db.Integer, nullable=False, default=0)
+    minutes_played = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'table_id', name='uq_daily_summary_day_table'),
+        db.Index('ix_daily_summary_owner_day', 'owner', 'day'),
+    )
+
+class CustomerBalance(db.Model):
+    """Running totals per owner and customer over live games, kept in step with game_record"""
+    id = db.Column(db.Integer, primary_key=True)
+    owner = db.Column(db.String(20), nullable=False)
+    customer_name = db.Column(db.String(100), nullable=False, default='')  # '' for games without a name yet
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'))
+    paid_total = db.Column(db.Float, nullable=False, default=0)
+    loan_total = db.Column(db.Float, nullable=False, default=0)
+    game_count = db.Column(db.Integer, nullable=False, default=0)
+    confirmed_count = db.Column(db.Integer, nullable=False, default=0)
+    last_activity = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('owner', 'customer_name', name='uq_customer_balance_owner_customer'),
+        # Loan list and top customers read straight off these
+        db.Index('ix_customer_balance_loan', 'loan_total'),
+        db.Index('ix_customer_balance_paid', 'paid_total'),
+    )
+
+class SchemaVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class GameStateVersion:
+    """Counter bumped on every committed GameRecord change, used for conditional GETs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = int(time.time())
+        self.value = 0
+        self.changed_at = datetime.now(timezone.utc)
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+            self.changed_at = datetime.now(timezone.utc)
+
+    def etag(self, *scope):
+        # The process id and start time keep tags from other workers or restarts from matching
+        return '-'.join(str(part) for part in (os.getpid(), self._started, self.value, *scope))
+
+    def last_modified(self):
+        """Last change rounded up to the second, or None while that second is still running"""
+        changed_at = self.changed_at
+        rounded = changed_at.replace(microsecond=0)
+        if rounded < changed_at:
+            rounded += timedelta(seconds=1)
+        if rounded > datetime.now(timezone.utc):
+            return None
+        return rounded
+
+game_state = GameStateVersion()
+
+@db.event.listens_for(db.session, 'before_flush')
+def update_customer_balances(session, flush_context, instances):
+    """Carry GameRecord inserts, updates and deletes into CustomerBalance within the same flush"""
+    changed = [obj for obj in session.deleted if isinstance(obj, GameRecord)]
+    changed += [obj for obj in session.dirty if isinstance(obj, GameRecord) and session.is_modified(obj)]
+    kept = [obj for obj in (*session.new, *changed)
+            if isinstance(obj, GameRecord) and obj not in session.deleted]
+    if not changed and not kept:
+        return
+
+    with session.no_autoflush:
+        # Concurrent writers to the same balance must not read it before the other commits
+        lock_for_writes()
+        # The database still holds what each changed game contributed before this flush
+        changed_ids = [game.id for game in changed]
+        removed = stored_balance_entries(changed_ids) if changed_ids else []
+        apply_balance_changes(removed, [current_balance_entry(game) for game in kept], changed_ids)
+
+@db.event.listens_for(db.session, 'after_flush')
+def track_changes(session, flush_context):
+    changed = (*session.new, *session.dirty, *session.deleted)
+    if any(isinstance(obj, Table) for obj in changed):
+        session.info['tables_changed'] = True
+    if any(isinstance(obj, GameRecord) for obj in changed):
+        session.info['games_changed'] = True
+
+@db.event.listens_for(db.session, 'after_commit')
+def publish_changes(session):
+    # Only act once the change is visible to other sessions
+    if session.info.pop('tables_changed', False):
+        table_registry.invalidate()
+    if session.info.pop('games_changed', False):
+        game_state.bump()
+
+@db.event.listens_for(db.session, 'after_rollback')
+def forget_changes(session):
+    session.info.pop('tables_changed', None)
+    session.info.pop('games_changed', None)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+# (username, password, role) of the accounts a new database starts with
+DEFAULT_USERS = [
+    ('admin', 'admin753159', 'admin'),
+    ('ayoub', 'ayoub54321', 'ayoub'),
+    ('ayman', 'ayman12345', 'ayman')
+]
+DEFAULT_TABLES = [('mini 1', 'ayoub'), ('mini 2', 'ayoub'), ('strong', 'ayman'), ('magnum', 'ayman')]
+
 def init_db():
+    """Drop everything and start from an empty, freshly seeded database"""
     with app.app_context():
         db.drop_all()  # Reset the database
-        db.create_all()
-        print("Database created successfully")
-
-        # Create users
-        users = [
-            User(username='admin', password_hash=generate_password_hash('admin753159'), role='admin'),
-            User(username='ayoub', password_hash=generate_password_hash('ayoub54321'), role='ayoub'),
-            User(username='ayman', password_hash=generate_password_hash('ayman12345'), role='ayman')
-        ]
-        db.session.add_all(users)
-        print("Users created")
-
-        # Create tables
-        tables = [
-            Table(name='mini 1', owner='ayoub'),
-            Table(name='mini 2', owner='ayoub'),
-            Table(name='strong', owner='ayman'),
-            Table(name='magnum', owner='ayman')
-        ]
-        db.session.add_all(tables)
+        print("Database dropped")
+    bootstrap_db()
+
+def schema_version():
+    """Applied migration version, 0 for a database that has never been migrated"""
+    if not db.inspect(db.engine).has_table(SchemaVersion.__tablename__):
+        return 0
+    schema = db.session.get(SchemaVersion, 1)
+    return schema.version if schema else 0
+
+def latest_schema_version():
+    return MIGRATIONS[-1][0]
+
+def seed_defaults():
+    """Add the default users and tables that are missing; existing rows are never touched"""
+    existing = {username for username, in db.session.query(User.username)}
+    # Only new accounts pay for a password hash
+    for username, password, role in DEFAULT_USERS:
+        if username not in existing:
+            db.session.add(User(username=username, password_hash=generate_password_hash(password), role=role))
+            print(f"Created user {username}")
+    
+    # Tables get renamed and moved around, so only an empty club is seeded
+    if db.session.query(Table.id).first() is None:
+        db.session.add_all(Table(name=name, owner=owner) for name, owner in DEFAULT_TABLES)
         print("Tables created")
+
+def bootstrap_db():
+    """Create or migrate whatever is missing and seed defaults; safe to run on every start"""
+    with app.app_context():
+        if schema_version() < latest_schema_version():
+            migrate_db()
+        seed_defaults()
+        db.session.commit()
+        # Don't hand pooled connections to forked workers
+        db.engine.dispose()
+    print("Database is ready")
+
+def check_schema():
+    """Cheap start-up check for workers: fail fast if nobody ran the migrations"""
+    with app.app_context():
+        version = schema_version()
+        db.session.remove()
+    if version < latest_schema_version():
+        raise RuntimeError(f"Database schema is at version {version}, expected {latest_schema_version()}; "
+                           f"run 'flask --app app migrate-db'")
+
+def create_game_record_indexes():
+    """Create the GameRecord hot-path indexes that are missing"""
+    for index in GameRecord.__table__.indexes:
+        index.create(db.session.connection(), checkfirst=True)
+
+# Indexes from before archived games left game_record, all led by the archived flag
+LEGACY_GAME_RECORD_INDEXES = ['ix_game_record_table_live', 'ix_game_record_customer', 'ix_game_record_day']
+
+def replace_archived_flag_indexes():
+    """Swap the GameRecord indexes led by the always-false archived flag for ones without it"""
+    connection = db.session.connection()
+    for name in LEGACY_GAME_RECORD_INDEXES:
+        connection.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+    create_game_record_indexes()
+
+def create_user_activity_indexes():
+    """Create the UserActivity timestamp indexes that are missing"""
+    for index in UserActivity.__table__.indexes:
+        index.create(db.session.connection(), checkfirst=True)
+
+# Ordered (version, step) pairs; every step must be safe to run twice
+def move_archived_records_to_history():
+    """Move games flagged archived by older versions into game_record_history"""
+    archive_game_records(GameRecord.archived == True)
+
+def add_customer_columns():
+    """Add game_record.customer_id and game_record_history.customer_id to older databases"""
+    connection = db.session.connection()
+    inspector = db.inspect(connection)
+    for model in (GameRecord, GameRecordHistory):
+        table = model.__tablename__
+        if 'customer_id' not in [column['name'] for column in inspector.get_columns(table)]:
+            connection.exec_driver_sql(
+                f'ALTER TABLE {table} ADD COLUMN customer_id INTEGER REFERENCES customer (id)')
+        index = next(index for index in model.__table__.indexes if index.name == f'ix_{table}_customer_id')
+        index.create(connection, checkfirst=True)
+
+def backfill_customers():
+    """Create one Customer per normalized name and point every game at it"""
+    # How often, and how lately, each spelling is used, across live and archived games
+    spellings = {}
+    for model in (GameRecord, GameRecordHistory):
+        rows = db.session.query(model.customer_name, db.func.count(), db.func.max(model.start_time)).filter(
+            model.customer_name != None, model.customer_name != ''
+        ).group_by(model.customer_name).all()
+        for name, count, last_used in rows:
+            total, latest = spellings.get(name, (0, None))
+            spellings[name] = (total + count, max(filter(None, (latest, last_used)), default=None))
+    
+    # The most used spelling of each key becomes the customer's display name; ties go to
+    # the one used most recently, then to a title-cased one. Width variants (fullwidth
+    # letters and the like) are folded with NFKC first, so they never win on code point.
+    by_key = {}
+    for name, (count, last_used) in spellings.items():
+        key = normalize_customer_name(name)
+        if key:
+            usage = by_key.setdefault(key, {})
+            display = ' '.join(unicodedata.normalize('NFKC', name).split())
+            total, latest = usage.get(display, (0, None))
+            usage[display] = (total + count, max(filter(None, (latest, last_used)), default=None))
+    existing = {customer.key: customer for customer in Customer.query.all()}
+    for key, usage in by_key.items():
+        if key not in existing:
+            name = max(usage, key=lambda name: (usage[name][0], usage[name][1] or datetime.min, name == name.title()))
+            existing[key] = Customer(key=key, name=name)
+            db.session.add(existing[key])
+    db.session.flush()
+    
+    updates = [{'old_name': name, 'new_name': existing[normalize_customer_name(name)].name,
+                'new_id': existing[normalize_customer_name(name)].id}
+               for name in spellings if normalize_customer_name(name)]
+    for model in (GameRecord, GameRecordHistory):
+        table = model.__table__
+        if updates:
+            db.session.execute(table.update().where(table.c.customer_name == db.bindparam('old_name')).values(
+                customer_name=db.bindparam('new_name'), customer_id=db.bindparam('new_id')), updates)
+    db.session.info['games_changed'] = True
+    customer_index.invalidate()
+    # The bulk rename merges balances too, which the flush hook never saw
+    rebuild_customer_balances()
+    print(f"Merged {len(spellings)} customer spellings into {len(by_key)} customers")
+
+def backfill_daily_summaries():
+    """Build the daily rollup for every day that has confirmed games"""
+    rebuild_daily_summaries()
+
+def backfill_customer_balances():
+    """Build the customer balance ledger from the live game records"""
+    rebuild_customer_balances()
+
+MIGRATIONS = [
+    (1, create_game_record_indexes),
+    (2, move_archived_records_to_history),
+    (3, backfill_daily_summaries),
+    (4, create_user_activity_indexes),
+    (5, backfill_customers),
+    (6, backfill_customer_balances),
+    (7, replace_archived_flag_indexes),
+]
+
+def migrate_db():
+    """Create missing tables and apply pending migration steps, keeping existing data"""
+    db.create_all()
+    # The steps below query and index through the current models, so tables created by
+    # older versions get the columns those models expect before any step runs
+    add_customer_columns()
+    schema = db.session.get(SchemaVersion, 1)
+    if schema is None:
+        schema = SchemaVersion(id=1, version=0)
+        db.session.add(schema)
+
+    db.session.commit()
+
+    # One transaction per step, so a failed step leaves the ones before it applied
+    for version, step in MIGRATIONS:
+        if version > schema.version:
+            step()
+            schema.version = version
+            db.session.commit()
+            print(f"Applied migration {version}: {step.__name__}")
+
+# Columns copied verbatim from game_record into game_record_history
+ARCHIVED_COLUMNS = ['table_id', 'start_time', 'end_time', 'price', 'payment_status',
+                    'state', 'customer_name', 'customer_id', 'created_by', 'confirmed']
+ARCHIVE_BATCH_SIZE = 500
+
+def archive_game_records(*criteria):
+    """Move matching games into game_record_history within the current transaction"""
+    # Lock and pin the ids first so rows confirmed meanwhile are neither lost nor half-moved
+    ids = db.session.execute(
+        db.select(GameRecord.id).where(*criteria).with_for_update()
+    ).scalars().all()
+    archived_at = datetime.now()
+    
+    for offset in range(0, len(ids), ARCHIVE_BATCH_SIZE):
+        batch = ids[offset:offset + ARCHIVE_BATCH_SIZE]
+        rows = db.select(
+            GameRecord.id,
+            *[getattr(GameRecord, column) for column in ARCHIVED_COLUMNS],
+            db.literal(archived_at, db.DateTime)
+        ).where(GameRecord.id.in_(batch))
+        db.session.execute(db.insert(GameRecordHistory).from_select(
+            ['game_id', *ARCHIVED_COLUMNS, 'archived_at'], rows))
+        # Archived games leave the balances; the bulk delete below bypasses the flush hook
+        with db.session.no_autoflush:
+            apply_balance_changes(stored_balance_entries(batch), [], batch)
+        db.session.execute(db.delete(GameRecord).where(GameRecord.id.in_(batch)))
+    
+    if ids:
+        # Bulk statements skip the flush hooks, so flag the game state change by hand
+        db.session.info['games_changed'] = True
+    return len(ids)
+
+# What one live game adds to its owner and customer's balance
+BalanceEntry = namedtuple('BalanceEntry', ['owner', 'customer_name', 'customer_id', 'paid', 'loan',
+                                           'confirmed', 'start_time'])
+
+def balance_entry(owner, customer_name, customer_id, price, payment_status, confirmed, start_time):
+    # Same rules as customer_activity_from_games: only confirmed games count as paid or loan
+    amount = (price or 0) if confirmed else 0
+    paid = payment_status == 'paid'
+    return BalanceEntry(owner, customer_name or '', customer_id, amount if paid else 0,
+                        0 if paid else amount, 1 if confirmed else 0, start_time)
+
+def current_balance_entry(game):
+    table = table_registry.get(game.table_id)
+    return table and balance_entry(table.owner, game.customer_name, game.customer_id, game.price,
+                                   game.payment_status, game.confirmed, game.start_time or datetime.now())
+
+def stored_balance_entries(ids):
+    """Balance entries of the given live games as the database has them now"""
+    rows = db.session.query(
+        Table.owner, GameRecord.customer_name, GameRecord.customer_id, GameRecord.price,
+        GameRecord.payment_status, GameRecord.confirmed, GameRecord.start_time
+    ).select_from(GameRecord).join(Table).filter(GameRecord.id.in_(ids)).with_for_update(of=GameRecord)
+    return [balance_entry(*row) for row in rows]
+
+def remaining_last_activity(owner, customer_name, excluded_ids):
+    """Newest start_time among a customer's live games, leaving out games being changed"""
+    name_matches = (GameRecord.customer_name == customer_name if customer_name else
+                    db.or_(GameRecord.customer_name == None, GameRecord.customer_name == ''))
+    return db.session.query(db.func.max(GameRecord.start_time)).join(Table).filter(
+        Table.owner == owner,
+        name_matches,
+        GameRecord.id.notin_(excluded_ids)
+    ).scalar()
+
+def apply_balance_changes(removed, added, changed_ids=()):
+    """Subtract removed entries and add added ones to the matching CustomerBalance rows"""
+    deltas = {}
+    for sign, entries in ((-1, removed), (1, added)):
+        for entry in filter(None, entries):
+            delta = deltas.setdefault((entry.owner, entry.customer_name), {
+                'paid': 0, 'loan': 0, 'games': 0, 'confirmed': 0,
+                'customer_id': None, 'newest_added': None, 'newest_removed': None
+            })
+            delta['paid'] += sign * entry.paid
+            delta['loan'] += sign * entry.loan
+            delta['games'] += sign
+            delta['confirmed'] += sign * entry.confirmed
+            newest = 'newest_added' if sign > 0 else 'newest_removed'
+            delta[newest] = max(filter(None, (delta[newest], entry.start_time)), default=None)
+            if sign > 0:
+                delta['customer_id'] = entry.customer_id or delta['customer_id']
+    
+    # A game saved without touching its balance fields cancels itself out
+    deltas = {key: delta for key, delta in deltas.items()
+              if delta['games'] or delta['confirmed'] or abs(delta['paid']) > 1e-9
+              or abs(delta['loan']) > 1e-9 or delta['newest_added'] != delta['newest_removed']}
+    if not deltas:
+        return
+    
+    lock_for_writes()
+    # Create missing rows first, so two writers adding a customer's first games both
+    # end up updating the same row instead of one failing on the unique constraint
+    insert = (postgresql_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert)(CustomerBalance)
+    db.session.execute(insert.on_conflict_do_nothing(), [
+        {'owner': owner, 'customer_name': customer_name, 'paid_total': 0, 'loan_total': 0,
+         'game_count': 0, 'confirmed_count': 0}
+        for owner, customer_name in deltas
+    ])
+    for (owner, customer_name), delta in deltas.items():
+        # Added in SQL, so the totals build on what other writers committed and on changes
+        # made earlier in this transaction; the UPDATE also locks the row
+        matches = (CustomerBalance.owner == owner, CustomerBalance.customer_name == customer_name)
+        db.session.execute(db.update(CustomerBalance).where(*matches).values(
+            game_count=CustomerBalance.game_count + delta['games'],
+            confirmed_count=CustomerBalance.confirmed_count + delta['confirmed'],
+            # Money is rounded to the cent so repeated updates don't leave float dust
+            paid_total=db.func.round(db.cast(CustomerBalance.paid_total + delta['paid'], db.Numeric), 2),
+            loan_total=db.func.round(db.cast(CustomerBalance.loan_total + delta['loan'], db.Numeric), 2),
+            customer_id=db.func.coalesce(delta['customer_id'], CustomerBalance.customer_id)
+        ), execution_options={'synchronize_session': 'fetch'})
+        game_count, last_activity = db.session.execute(
+            db.select(CustomerBalance.game_count, CustomerBalance.last_activity).where(*matches)
+        ).one()
+        if game_count <= 0:
+            # No live games left, just like the grouped query would have no row
+            db.session.execute(db.delete(CustomerBalance).where(*matches),
+                               execution_options={'synchronize_session': 'fetch'})
+            continue
         
+        newest = last_activity
+        if delta['newest_removed'] and newest and delta['newest_removed'] >= newest:
+            # The newest game moved away, so look up the next newest one
+            newest = remaining_last_activity(owner, customer_name, changed_ids)
+        newest = max(filter(None, (newest, delta['newest_added'])), default=None)
+        if newest != last_activity:
+            db.session.execute(db.update(CustomerBalance).where(*matches).values(last_activity=newest),
+                               execution_options={'synchronize_session': 'fetch'})
+
+def rebuild_customer_balances():
+    """Recompute the whole CustomerBalance ledger from live game records"""
+    db.session.execute(db.delete(CustomerBalance))
+    rows = [{
+        'owner': row.owner,
+        'customer_name': row.customer_name,
+        'customer_id': row.customer_id,
+        'paid_total': round(row.paid, 2),
+        'loan_total': round(row.loan, 2),
+        'game_count': row.games,
+        'confirmed_count': row.confirmed_games,
+        'last_activity': row.last_activity
+    } for row in customer_activity_from_games()]
+    if rows:
+        db.session.execute(db.insert(CustomerBalance), rows)
+    return len(rows)
+
+def balance_mismatches():
+    """(owner, customer, field, ledger value, value from game records) wherever the two disagree"""
+    expected = {(row.owner, row.customer_name): row for row in customer_activity_from_games()}
+    ledger = {(balance.owner, balance.customer_name): balance for balance in CustomerBalance.query.all()}
+    fields = [('paid_total', 'paid'), ('loan_total', 'loan'), ('game_count', 'games'),
+              ('confirmed_count', 'confirmed_games'), ('last_activity', 'last_activity')]
+    
+    mismatches = []
+    for key in sorted(set(expected) | set(ledger)):
+        balance, row = ledger.get(key), expected.get(key)
+        for field, column in fields:
+            stored = getattr(balance, field) if balance else None
+            actual = getattr(row, column) if row else None
+            if isinstance(actual, float) or isinstance(stored, float):
+                matches = abs((stored or 0) - (actual or 0)) < 0.005
+            else:
+                matches = stored == actual
+            if not matches:
+                mismatches.append((*key, field, stored, actual))
+    return mismatches
+
+class CustomerIndex:
+    """Sorted in-memory index of customer keys for prefix autocomplete"""
+
+    def __init__(self, max_age_seconds=300):
+        # Reloaded now and then so customers created by other workers show up too
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._entries = None
+        self._loaded_at = 0
+
+    def _load(self):
+        entries = sorted((customer.key, customer.name, customer.id) for customer in
+                         db.session.query(Customer.key, Customer.name, Customer.id))
+        with self._lock:
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+        return entries
+
+    def search(self, prefix, limit=10):
+        entries = self._entries
+        if entries is None or time.monotonic() - self._loaded_at > self.max_age_seconds:
+            entries = self._load()
+        key = normalize_customer_name(prefix)
+        start = bisect.bisect_left(entries, (key,))
+        matches = []
+        for entry in entries[start:start + limit]:
+            if not entry[0].startswith(key):
+                break
+            matches.append({'id': entry[2], 'name': entry[1]})
+        return matches
+
+    def add(self, customer):
+        with self._lock:
+            if self._entries is not None:
+                bisect.insort(self._entries, (customer.key, customer.name, customer.id))
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+
+customer_index = CustomerIndex()
+
+def find_customer(name):
+    """The Customer whose normalized name matches, or None"""
+    key = normalize_customer_name(name)
+    return Customer.query.filter_by(key=key).first() if key else None
+
+def get_or_create_customer(name):
+    """The matching Customer, created on first use; None for a blank name"""
+    customer = find_customer(name)
+    if customer or not normalize_customer_name(name):
+        return customer
+    
+    customer = Customer(name=' '.join(name.split()), key=normalize_customer_name(name))
+    try:
+        # Savepoint: a concurrent request may create the same customer first
+        with db.session.begin_nested():
+            db.session.add(customer)
+    except IntegrityError:
+        return find_customer(name)
+    customer_index.add(customer)
+    return customer
+
+def assign_customer(record, name):
+    """Set a game's customer, using the canonical spelling when the customer is known"""
+    customer = get_or_create_customer(name)
+    record.customer_id = customer.id if customer else None
+    record.customer_name = customer.name if customer else name
+
+def canonical_customer_name(name):
+    customer = find_customer(name)
+    return customer.name if customer else name
+
+def minutes_between(start, end):
+    """SQL expression for the minutes between two datetime columns"""
+    if db.engine.dialect.name == 'postgresql':
+        return db.func.extract('epoch', end - start) / 60
+    return (db.func.julianday(end) - db.func.julianday(start)) * 1440
+
+def refresh_daily_summary(day):
+    """Recompute one day's rollup rows from the raw games, live and archived"""
+    day_start, day_end = day_bounds(day)
+    games = db.union_all(*[
+        db.select(model.table_id, model.price, model.payment_status, model.start_time, model.end_time).where(
+            model.confirmed == True,
+            model.start_time >= day_start,
+            model.start_time < day_end
+        )
+        for model in (GameRecord, GameRecordHistory)
+    ]).subquery()
+    
+    is_paid = games.c.payment_status == 'paid'
+    rows = db.session.execute(db.select(
+        games.c.table_id,
+        db.func.sum(db.case((is_paid, games.c.price), else_=0)),
+        db.func.sum(db.case((is_paid, 0), else_=games.c.price)),
+        db.func.count(),
+        db.func.sum(db.case((games.c.end_time != None, minutes_between(games.c.start_time, games.c.end_time)), else_=0))
+    ).group_by(games.c.table_id)).all()
+    
+    day = day_start.date()
+    db.session.execute(db.delete(DailySummary).where(DailySummary.day == day))
+    db.session.add_all([
+        DailySummary(
+            day=day,
+            owner=table_registry.get(table_id).owner,
+            table_id=table_id,
+            paid_total=paid_total or 0,
+            loan_total=loan_total or 0,
+            game_count=game_count,
+            minutes_played=round(minutes_played or 0, 1)
+        )
+        for table_id, paid_total, loan_total, game_count, minutes_played in rows
+    ])
+    return len(rows)
+
+def rebuild_daily_summaries(start=None, end=None):
+    """Recompute the rollup for every day in [start, end], defaulting to all recorded days"""
+    if start is None or end is None:
+        bounds = [db.session.query(db.func.min(model.start_time), db.func.max(model.start_time)).one()
+                  for model in (GameRecord, GameRecordHistory)]
+        starts = [low for low, high in bounds if low]
+        ends = [high for low, high in bounds if high]
+        if not starts:
+            return 0
+        start = start or min(starts).date()
+        end = end or max(ends).date()
+    
+    days = 0
+    day = start
+    while day <= end:
+        refresh_daily_summary(day)
+        day += timedelta(days=1)
+        days += 1
+    return days
+
+def day_bounds(date):
+    """Start of the given day and of the next one, for index-friendly start_time ranges"""
+    start = datetime(date.year, date.month, date.day)
+    return start, start + timedelta(days=1)
+
+# Hourly rates in MAD, by table kind (the first word of the table name)
+Tariff = namedtuple('Tariff', ['day_rate', 'evening_rate', 'weekend_rate', 'minimum_charge'])
+TABLE_TARIFFS = {
+    'mini': Tariff(day_rate=20, evening_rate=25, weekend_rate=25, minimum_charge=10),
+    'strong': Tariff(day_rate=30, evening_rate=35, weekend_rate=35, minimum_charge=15),
+    'magnum': Tariff(day_rate=40, evening_rate=50, weekend_rate=50, minimum_charge=20),
+}
+DEFAULT_TARIFF = TABLE_TARIFFS['mini']
+EVENING_HOURS = (18, 24)  # Evening rate from 18:00 until midnight on weekdays
+WEEKEND_DAYS = (5, 6)  # Saturday and Sunday are billed at the weekend rate all day
+PRICE_STEP = 0.5  # Prices are rounded up to the next half dirham
+
+def tariff_for_name(table_name):
+    kind = table_name.split()[0].lower() if table_name.split() else None
+    return TABLE_TARIFFS.get(kind, DEFAULT_TARIFF)
+
+def table_tariff(table_id):
+    # Resolved once per table when the registry loads
+    table = table_registry.get(table_id)
+    return table.tariff if table else DEFAULT_TARIFF
+
+def overlap_seconds(start, end, band_start, band_end):
+    return max((min(end, band_end) - max(start, band_start)).total_seconds(), 0)
+
+def tariff_seconds(start, end):
+    """Seconds of [start, end) falling in the day, evening and weekend bands"""
+    day_seconds = evening_seconds = weekend_seconds = 0
+    day = datetime(start.year, start.month, start.day)
+    while day < end:
+        next_day = day + timedelta(days=1)
+        if day.weekday() in WEEKEND_DAYS:
+            weekend_seconds += overlap_seconds(start, end, day, next_day)
+        else:
+            evening = overlap_seconds(start, end, day + timedelta(hours=EVENING_HOURS[0]),
+                                      day + timedelta(hours=EVENING_HOURS[1]))
+            evening_seconds += evening
+            day_seconds += overlap_seconds(start, end, day, next_day) - evening
+        day = next_day
+    return day_seconds, evening_seconds, weekend_seconds
+
+def price_intervals(table_ids, start_times, end_times):
+    """Tariff price of every (table, start, end) triple; a missing end means the game is still running"""
+    now = datetime.now()
+    tariffs = {}
+    prices = []
+    for table_id, start_time, end_time in zip(table_ids, start_times, end_times):
+        if table_id not in tariffs:
+            tariffs[table_id] = table_tariff(table_id)
+        tariff = tariffs[table_id]
+        day_seconds, evening_seconds, weekend_seconds = tariff_seconds(start_time, end_time or now)
+        amount = (day_seconds * tariff.day_rate + evening_seconds * tariff.evening_rate
+                  + weekend_seconds * tariff.weekend_rate) / 3600
+        # round() first so float noise like 20.000000001 doesn't bump a price up a whole step
+        steps = math.ceil(round(max(amount, tariff.minimum_charge) / PRICE_STEP, 6))
+        prices.append(steps * PRICE_STEP)
+    return prices
+
+def calculate_price(start_time, end_time, table_id=None):
+    """Tariff price of a single game"""
+    return price_intervals([table_id], [start_time], [end_time])[0]
+
+def running_prices(games):
+    """What each game costs so far: the price typed in if any, else the tariff price"""
+    tariff_prices = price_intervals([game.table_id for game in games], [game.start_time for game in games],
+                                    [game.end_time for game in games])
+    return [game.price or tariff_price for game, tariff_price in zip(games, tariff_prices)]
+
+def hot_queries():
+    """Representative versions of the GameRecord queries on the request path"""
+    owners = ['ayoub', 'ayman']
+    day_start, day_end = day_bounds(datetime.now())
+    return {
+        'active_games_all': GameRecord.query.filter_by(state='inprogress'),
+        'active_games_owner': GameRecord.query.join(Table).filter(
+            Table.owner == 'ayoub', GameRecord.state == 'inprogress'),
+        'new_record_check': GameRecord.query.filter_by(table_id=1, state='inprogress'),
+        'user_dashboard_records': GameRecord.query.join(Table).filter(
+            Table.owner == 'ayoub'),
+        'customer_activity': customer_activity_query(owners),
+        'invoice': GameRecord.query.join(Table).filter(
+            Table.owner == 'ayoub',
+            GameRecord.customer_name == 'customer',
+            GameRecord.confirmed == True
+        ).order_by(GameRecord.start_time.desc()),
+        'pay_loan': GameRecord.query.join(Table).filter(
+            Table.owner == 'ayoub',
+            GameRecord.customer_name == 'customer',
+            GameRecord.payment_status == 'loan'
+        ).order_by(GameRecord.start_time),
+        'daily_invoice': GameRecord.query.join(Table).filter(
+            Table.owner == 'ayoub',
+            GameRecord.confirmed == True,
+            GameRecord.start_time >= day_start,
+            GameRecord.start_time < day_end
+        ),
+        'reset_day': GameRecord.query.filter(*reset_day_criteria(day_end)),
+    }
+
+def explain_query(query):
+    """Return the database's query plan for a SQLAlchemy query, one line per step"""
+    compiled = query.statement.compile(dialect=db.engine.dialect,
+                                       compile_kwargs={'render_postcompile': True})
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    connection = db.session.connection()
+    if db.engine.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql('EXPLAIN ' + str(compiled), params).fetchall()
+        return [row[0] for row in rows]
+
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).fetchall()
+    return [row[-1] for row in rows]
+
+def constant_columns(model):
+    """Indexed columns holding at most one distinct value: an equality on them narrows nothing"""
+    names = {column.name for index in model.__table__.indexes for column in index.columns}
+    return {name for name in names
+            if db.session.query(db.func.count(db.distinct(model.__table__.c[name]))).scalar() <= 1}
+
+def uses_index(plan, table_name='game_record', constant=()):
+    """Whether every step that reads table_name goes through an index that narrows it down
+
+    An index search whose leading equality is on a constant column reads every row too.
+    """
+    scanned_table = None
+    for line in plan:
+        if f'Seq Scan on {table_name}' in line:
+            return False
+        if line.startswith(f'SCAN {table_name}') and 'USING' not in line:
+            return False
+        # SQLite: SEARCH game_record USING INDEX ix_name (confirmed=? AND start_time<?)
+        search = re.match(rf'SEARCH {table_name} USING (?:COVERING )?INDEX \S+ \((\w+)=', line)
+        if search and search.group(1) in constant:
+            return False
+        # PostgreSQL: an Index Cond line belongs to the scan node above it
+        node = re.search(r'(?:(?<!Bitmap )Index Scan|Index Only Scan|Bitmap Heap Scan)(?: Backward)?(?: using \S+)? on "?(\w+)', line)
+        if node:
+            scanned_table = node.group(1)
+        condition = re.search(r'(?:Index Cond|Recheck Cond): \(+(?:\w+\.)?(\w+) = ', line)
+        if condition and scanned_table == table_name and condition.group(1) in constant:
+            return False
+    return True
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Apply pending schema migrations and add missing default users and tables."""
+    bootstrap_db()
+
+@app.cli.command('rebuild-summaries')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First day (default: first recorded game)')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day (default: last recorded game)')
+def rebuild_summaries_command(start, end):
+    """Rebuild the daily rollup from raw game records."""
+    days = rebuild_daily_summaries(start and start.date(), end and end.date())
+    db.session.commit()
+    print(f"Rebuilt daily summaries for {days} days")
+
+@app.cli.command('reconcile-balances')
+@click.option('--fix', is_flag=True, help='Rebuild the ledger from game records if it is off')
+def reconcile_balances_command(fix):
+    """Check the customer balance ledger against raw game records."""
+    mismatches = balance_mismatches()
+    for owner, customer_name, field, stored, actual in mismatches:
+        print(f"{owner} / {customer_name or '(no name)'}: {field} is {stored}, game records say {actual}")
+    if not mismatches:
+        print("Customer balances match the game records")
+    elif fix:
+        rows = rebuild_customer_balances()
+        db.session.commit()
+        print(f"Rebuilt {rows} customer balances")
+    else:
+        raise SystemExit(f"{len(mismatches)} balance fields are off; run with --fix to rebuild")
+
+@app.cli.command('reprice-day')
+@click.option('--day', type=click.DateTime(formats=['%Y-%m-%d']), help='Day to price (default: today)')
+@click.option('--apply', is_flag=True, help='Store the tariff price on finished games that have no price yet')
+def reprice_day_command(day, apply):
+    """Compare the tariff price of a day's games with what was charged."""
+    day_start, day_end = day_bounds(day or datetime.now())
+    games = GameRecord.query.join(Table).filter(
+        GameRecord.start_time >= day_start,
+        GameRecord.start_time < day_end
+    ).order_by(GameRecord.start_time).all()
+    prices = price_intervals([game.table_id for game in games], [game.start_time for game in games],
+                             [game.end_time for game in games])
+    
+    unpriced = []
+    for game, price in zip(games, prices):
+        print(f"{game.id:>8} {game.start_time:%H:%M} {table_registry.get(game.table_id).name:<12} "
+              f"charged {game.price:>8.2f}  tariff {price:>8.2f}")
+        if game.state == 'finished' and not game.price:
+            unpriced.append((game.id, price))
+    print(f"Charged {sum(game.price for game in games):.2f} MAD, tariff {sum(prices):.2f} MAD")
+    
+    if apply:
+        for game_id, price in unpriced:
+            update_game_records([game_id], price=price)
         db.session.commit()
-        print("Database initialized successfully")
+        print(f"Priced {len(unpriced)} games that had no price")
+
+@app.cli.command('purge-activities')
+@click.option('--days', type=int, help='Retention window in days (default: ACTIVITY_RETENTION_DAYS)')
+def purge_activities_command(days):
+    """Archive and delete activity log entries older than the retention window."""
+    activity_log.flush()
+    purged = purge_old_activities(days)
+    print(f"Archived {purged} activity log entries to {ACTIVITY_ARCHIVE_DIR}")
+
+@app.cli.command('read-activity-archive')
+@click.option('--since', type=click.DateTime(), help='Only entries at or after this time')
+@click.option('--until', type=click.DateTime(), help='Only entries at or before this time')
+@click.option('--user-id', type=int, help='Only entries of this user')
+def read_activity_archive_command(since, until, user_id):
+    """Print archived activity log entries as JSON lines."""
+    for entry in read_archived_activities(since, until, user_id):
+        click.echo(json.dumps(entry))
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Check that every hot GameRecord query is served by an index.
+
+    Plans depend on the data, so run this against a seeded database (see benchmarks).
+    """
+    if db.session.query(GameRecord.id).first() is None:
+        raise SystemExit("game_record is empty; point SQLALCHEMY_DATABASE_URI at a seeded database")
+    constant = constant_columns(GameRecord)
+    failures = 0
+    for name, query in hot_queries().items():
+        plan = explain_query(query)
+        ok = uses_index(plan, constant=constant)
+        failures += not ok
+        print(f"{'OK  ' if ok else 'SCAN'} {name}")
+        for line in plan:
+            print(f"       {line}")
+    db.session.rollback()
+    if failures:
+        raise SystemExit(f"{failures} queries do not use an index")
+
+class ActivityLogWriter:
+    """Buffers UserActivity rows and inserts them in batches from a background thread"""
+
+    def __init__(self, flush_size=50, flush_seconds=2.0, max_pending=10000):
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._pending = []
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.max_delay_seconds = 0.0
+
+    def record(self, user_id, action, details=None):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's buffer and thread don't exist here
+                self._reset()
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append({
+                'user_id': user_id,
+                'action': action,
+                'details': details,
+                'timestamp': datetime.now()
+            })
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='activity-log', daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.flush_size:
+                self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Insert everything buffered so far; failed batches go back to the buffer"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        
+        try:
+            with app.app_context():
+                with db.engine.begin() as connection:
+                    connection.execute(db.insert(UserActivity), batch)
+        except Exception as e:
+            print(f"Activity log flush failed: {e}")
+            with self._lock:
+                self.failed_flushes += 1
+                room = max(self.max_pending - len(self._pending), 0)
+                self.dropped += max(len(batch) - room, 0)
+                self._pending[:0] = batch[:room]
+            return 0
+        
+        delay = (datetime.now() - batch[0]['timestamp']).total_seconds()
+        with self._lock:
+            self.written += len(batch)
+            self.max_delay_seconds = max(self.max_delay_seconds, delay)
+        return len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed_flushes': self.failed_flushes,
+                'max_delay_seconds': round(self.max_delay_seconds, 3)
+            }
+
+# ActivityLogWriter.stats() entries that only ever grow
+ACTIVITY_LOG_COUNTERS = ('written', 'dropped', 'failed_flushes')
+
+activity_log = ActivityLogWriter(
+    flush_size=int(os.getenv('ACTIVITY_FLUSH_SIZE', 50)),
+    flush_seconds=float(os.getenv('ACTIVITY_FLUSH_SECONDS', 2)),
+    max_pending=int(os.getenv('ACTIVITY_MAX_PENDING', 10000))
+)
+atexit.register(activity_log.flush)
+
+# Activity log retention: older rows are exported to gzipped JSONL segments, then deleted
+ACTIVITY_RETENTION_DAYS = int(os.getenv('ACTIVITY_RETENTION_DAYS', 90))
+ACTIVITY_RETENTION_INTERVAL_HOURS = float(os.getenv('ACTIVITY_RETENTION_INTERVAL_HOURS', 24))
+ACTIVITY_ARCHIVE_DIR = os.getenv('ACTIVITY_ARCHIVE_DIR') or os.path.join(app.instance_path, 'activity_archive')
+ACTIVITY_ARCHIVE_BATCH_SIZE = 5000
+SEGMENT_TIME_FORMAT = '%Y%m%dT%H%M%S'
+
+def write_activity_segment(rows):
+    """Write one immutable segment file; its name records the time span it covers"""
+    first, last = rows[0], rows[-1]
+    name = (f"activity-{first.timestamp.strftime(SEGMENT_TIME_FORMAT)}"
+            f"-{last.timestamp.strftime(SEGMENT_TIME_FORMAT)}-{first.id}.jsonl.gz")
+    path = os.path.join(ACTIVITY_ARCHIVE_DIR, name)
+    tmp_path = path + '.tmp'
+    
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as segment:
+        for row in rows:
+            segment.write(json.dumps({
+                'id': row.id,
+                'user_id': row.user_id,
+                'username': row.username,
+                'action': row.action,
+                'details': row.details,
+                'timestamp': row.timestamp.isoformat()
+            }) + '\n')
+        segment.flush()
+        os.fsync(segment.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+def purge_old_activities(retention_days=None):
+    """Export activity rows older than the retention window, then delete them in batches"""
+    retention_days = ACTIVITY_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    os.makedirs(ACTIVITY_ARCHIVE_DIR, exist_ok=True)
+    
+    # One purge at a time across workers, or two could export the same rows
+    with open(os.path.join(ACTIVITY_ARCHIVE_DIR, '.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        
+        purged = 0
+        while True:
+            rows = db.session.query(
+                UserActivity.id,
+                UserActivity.user_id,
+                User.username,
+                UserActivity.action,
+                UserActivity.details,
+                UserActivity.timestamp
+            ).join(User).filter(UserActivity.timestamp < cutoff).order_by(
+                UserActivity.timestamp, UserActivity.id
+            ).limit(ACTIVITY_ARCHIVE_BATCH_SIZE).all()
+            if not rows:
+                break
+            
+            # The segment is on disk before the rows go; a crash in between only duplicates them
+            write_activity_segment(rows)
+            db.session.execute(db.delete(UserActivity).where(UserActivity.id.in_([row.id for row in rows])))
+            db.session.commit()
+            purged += len(rows)
+        return purged
+
+def read_archived_activities(since=None, until=None, user_id=None):
+    """Stream archived activity entries (dicts) in time order, straight from the segments"""
+    for path in sorted(glob.glob(os.path.join(ACTIVITY_ARCHIVE_DIR, 'activity-*.jsonl.gz'))):
+        _, first, last, _ = os.path.basename(path).split('-', 3)
+        # Skip whole segments outside the requested window without opening them
+        if since and datetime.strptime(last, SEGMENT_TIME_FORMAT) < since.replace(microsecond=0):
+            continue
+        if until and datetime.strptime(first, SEGMENT_TIME_FORMAT) > until:
+            continue
+        
+        with gzip.open(path, 'rt', encoding='utf-8') as segment:
+            for line in segment:
+                entry = json.loads(line)
+                timestamp = datetime.fromisoformat(entry['timestamp'])
+                if since and timestamp < since or until and timestamp > until:
+                    continue
+                if user_id is not None and entry['user_id'] != user_id:
+                    continue
+                yield entry
+
+def run_activity_retention():
+    while True:
+        time.sleep(ACTIVITY_RETENTION_INTERVAL_HOURS * 3600)
+        try:
+            with app.app_context():
+                purged = purge_old_activities()
+            if purged:
+                print(f"Archived {purged} activity log entries")
+        except Exception as e:
+            print(f"Activity retention failed: {e}")
+
+retention_pid = None
+
+@app.before_request
+def start_activity_retention():
+    # Started lazily so each worker process (after any fork) gets its own thread
+    global retention_pid
+    if retention_pid != os.getpid() and ACTIVITY_RETENTION_INTERVAL_HOURS > 0:
+        retention_pid = os.getpid()
+        threading.Thread(target=run_activity_retention, name='activity-retention', daemon=True).start()
 
 def log_user_activity(user, action, details=None):
     """Log user activity to the database"""
-    activity = UserActivity(
-        user_id=user.id,
-        action=action,
-        details=details
-    )
-    db.session.add(activity)
-    db.session.commit()
+    if app.config['ACTIVITY_LOG_SYNC']:
+        activity = UserActivity(
+            user_id=user.id,
+            action=action,
+            details=details
+        )
+        db.session.add(activity)
+        db.session.commit()
+        return
+    
+    # Batched by the background writer so the request only pays for its own commit
+    activity_log.record(user.id, action, details)
+
+# Seconds between keep-alive comments, and before a stream is closed so the browser reconnects
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = 600
+
+class GameEventPublisher:
+    """Fans active-game changes out to every open stream in this process"""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        subscription = queue.Queue(maxsize=self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def is_subscribed(self, subscription):
+        with self._lock:
+            return subscription in self._subscribers
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait(event)
+            except queue.Full:
+                # A stalled client is dropped; it gets a fresh snapshot when it reconnects
+                self.unsubscribe(subscription)
+
+game_events = GameEventPublisher()
+
+def serialize_active_game(game, table, running_price):
+    """JSON shape of an in-progress game, shared by the polling and streaming endpoints"""
+    # No server-side duration: clients tick from started_at, so the payload only
+    # changes when the game itself does (running_price is as of the response)
+    return {
+        'id': game.id,
+        'table_name': table.name,
+        'table_owner': table.owner,
+        'start_time': game.start_time.strftime('%Y-%m-%d %H:%M'),
+        'started_at': game.start_time.isoformat(),
+        'price': f"{game.price:.2f} MAD",
+        'running_price': running_price
+    }
+
+def serialize_active_games(games):
+    return [serialize_active_game(game, table_registry.get(game.table_id), price)
+            for game, price in zip(games, running_prices(games))]
+
+def publish_game_change(game, deleted=False):
+    """Tell open streams that a game started, changed or left the active list (call after commit)"""
+    table = table_registry.get(game.table_id)
+    if game.state == 'inprogress' and not deleted:
+        game_events.publish({'type': 'upsert', 'owner': table.owner, 'game': serialize_active_games([game])[0]})
+    else:
+        game_events.publish({'type': 'remove', 'owner': table.owner, 'game': {'id': game.id}})
+
+def not_modified(etag):
+    """A 304 response if the client already holds the current game state, else None"""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        last_modified = game_state.last_modified()
+        fresh = (last_modified is not None and request.if_modified_since is not None
+                 and request.if_modified_since >= last_modified)
+    if not fresh:
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+def with_validators(response, etag):
+    """Attach the game state ETag and Last-Modified so the next poll can be conditional"""
+    response.set_etag(etag)
+    last_modified = game_state.last_modified()
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def format_sse(event, data):
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Requests slower than this are logged together with the SQL they ran
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', 1.0))
+SLOW_REQUEST_MAX_STATEMENTS = 100
+
+class Histogram:
+    """Cumulative-bucket histogram per label value, rendered in Prometheus text format"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{endpoint="{label}",le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{endpoint="{label}"}} {series["sum"]:.6f}')
+                lines.append(f'{self.name}_count{{endpoint="{label}"}} {series["count"]}')
+        return lines
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+request_latency = Histogram('snooker_request_duration_seconds', 'Wall time per request.', LATENCY_BUCKETS)
+request_sql_time = Histogram('snooker_request_sql_duration_seconds', 'Time spent in SQL per request.', LATENCY_BUCKETS)
+request_sql_count = Histogram('snooker_request_sql_statements', 'SQL statements per request.',
+                              (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+@db.event.listens_for(Engine, 'before_cursor_execute')
+def start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@db.event.listens_for(Engine, 'after_cursor_execute')
+def record_sql_time(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or not conn.info.get('query_started'):
+        return
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_time += elapsed
+        if len(g.sql_statements) < SLOW_REQUEST_MAX_STATEMENTS:
+            g.sql_statements.append((elapsed, statement))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_time = 0.0
+    g.sql_statements = []
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unmatched'
+    request_latency.observe(endpoint, elapsed)
+    request_sql_time.observe(endpoint, g.sql_time)
+    request_sql_count.observe(endpoint, g.sql_count)
+    
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        statements = '\n'.join(f"  {duration * 1000:8.1f} ms  {statement}" for duration, statement in g.sql_statements)
+        app.logger.warning(
+            f"Slow request {request.method} {request.path} ({endpoint}): {elapsed:.3f}s, "
+            f"{g.sql_count} statements, {g.sql_time:.3f}s in SQL\n{statements}"
+        )
+    return response
+
+@app.route('/admin/metrics')
+def metrics():
+    # Admins in the browser, or a scraper presenting METRICS_TOKEN as a bearer token
+    token = os.getenv('METRICS_TOKEN')
+    scraper = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not scraper and not (current_user.is_authenticated and current_user.role == 'admin'):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    lines = []
+    for histogram in (request_latency, request_sql_time, request_sql_count):
+        lines.extend(histogram.render())
+    for name, value in activity_log.stats().items():
+        # Running totals are counters (so rate() survives restarts); the rest are point-in-time
+        if name in ACTIVITY_LOG_COUNTERS:
+            lines.append(f"# TYPE snooker_activity_log_{name}_total counter")
+            lines.append(f"snooker_activity_log_{name}_total {value}")
+        else:
+            lines.append(f"# TYPE snooker_activity_log_{name} gauge")
+            lines.append(f"snooker_activity_log_{name} {value}")
+    
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
@@ -153,8 +1510,8 @@ def user_dashboard():
     if current_user.role == 'admin':
         return redirect(url_for('admin_dashboard'))
     
-    tables = Table.query.filter_by(owner=current_user.username).all()
-    records = GameRecord.query.join(Table).filter(Table.owner == current_user.username, GameRecord.archived == False).all()
+    tables = table_registry.for_owner(current_user.username)
+    records = GameRecord.query.join(Table).filter(Table.owner == current_user.username).all()
     total_paid, total_loan, customer_stats = get_user_totals(current_user.username)
     
     return render_template('user_dashboard.html', 
@@ -173,69 +1530,46 @@ def admin_dashboard():
     
     # Only get Ayoub and Ayman users
     users = User.query.filter(User.role.in_(['ayoub', 'ayman'])).all()
-    user_stats = {}
     customer_loans = []
     top_customers = []
     
-    for user in users:
-        total_paid, total_loan, customer_stats = get_user_totals(user.username)
-        user_stats[user.username] = {
-            'total_paid': total_paid,
-            'total_loan': total_loan,
-            'customer_stats': customer_stats
-        }
-        
-        # Get customer loans for this user
-        for customer, stats in customer_stats.items():
-            if stats['loan'] > 0:
-                # Get last activity for this customer
-                last_record = GameRecord.query.join(Table).filter(
-                    Table.owner == user.username,
-                    GameRecord.customer_name == customer,
-                    GameRecord.archived == False
-                ).order_by(GameRecord.start_time.desc()).first()
-                
-                customer_loans.append({
-                    'name': customer,
-                    'total_loan': stats['loan'],
-                    'last_activity': last_record.start_time if last_record else datetime.now(),
-                    'owner': user.username
-                })
-        
-        # Get top paying customers for this user
-        for customer, stats in customer_stats.items():
-            if stats['paid'] > 0:
-                # Get last activity for this customer
-                last_record = GameRecord.query.join(Table).filter(
-                    Table.owner == user.username,
-                    GameRecord.customer_name == customer,
-                    GameRecord.archived == False
-                ).order_by(GameRecord.start_time.desc()).first()
-                
-                top_customers.append({
-                    'name': customer,
-                    'total_paid': stats['paid'],
-                    'last_activity': last_record.start_time if last_record else datetime.now(),
-                    'owner': user.username
-                })
+    # Per-user totals, customer loans and top customers all come from the balance ledger
+    owners = [user.username for user in users]
+    user_stats = summarize_user_totals(get_customer_activity(owners), owners)
     
-    # Sort customer loans by total loan amount (descending)
-    customer_loans = sorted(customer_loans, key=lambda x: x['total_loan'], reverse=True)
+    # Customer loans by total loan amount (descending)
+    for balance in CustomerBalance.query.filter(
+        CustomerBalance.owner.in_(owners), CustomerBalance.loan_total > 0
+    ).order_by(CustomerBalance.loan_total.desc()):
+        customer_loans.append({
+            'name': balance.customer_name,
+            'total_loan': balance.loan_total,
+            'last_activity': balance.last_activity or datetime.now(),
+            'owner': balance.owner
+        })
     
-    # Sort top customers by total paid amount (descending) and get top 10
-    top_customers = sorted(top_customers, key=lambda x: x['total_paid'], reverse=True)[:10]
+    # Top 10 customers by total paid amount (descending)
+    for balance in CustomerBalance.query.filter(
+        CustomerBalance.owner.in_(owners), CustomerBalance.paid_total > 0
+    ).order_by(CustomerBalance.paid_total.desc()).limit(10):
+        top_customers.append({
+            'name': balance.customer_name,
+            'total_paid': balance.paid_total,
+            'last_activity': balance.last_activity or datetime.now(),
+            'owner': balance.owner
+        })
     
     # Get recent activity logs for all users
-    recent_activities = UserActivity.query.join(User).order_by(
-        UserActivity.timestamp.desc()
+    recent_activities = UserActivity.query.options(db.joinedload(UserActivity.user)).order_by(
+        UserActivity.timestamp.desc(), UserActivity.id.desc()
     ).limit(50).all()
     
-    # Group activities by user
-    user_activities = {}
-    for user in users + [User.query.filter_by(role='admin').first()]:
-        user_activities[user.username] = UserActivity.query.filter_by(
-            user_id=user.id
-        ).order_by(UserActivity.timestamp.desc()).limit(20).all()
+    # Last 20 activities of each worker and the admin, in one ranked query
+    panel_users = users + User.query.filter_by(role='admin').limit(1).all()
+    user_activities = {user.username: [] for user in panel_users}
+    usernames = {user.id: user.username for user in panel_users}
+    for activity in latest_activities_per_user(list(usernames), 20):
+        user_activities[usernames[activity.user_id]].append(activity)
     
     return render_template('admin_dashboard.html', 
                          users=users, 
@@ -245,88 +1579,483 @@ def admin_dashboard():
                          recent_activities=recent_activities,
                          user_activities=user_activities)
 
-@app.route('/admin/invoice/<username>/<customer_name>')
+def latest_activities_per_user(user_ids, limit):
+    """Each user's newest activities (up to limit), newest first, using ROW_NUMBER() per user"""
+    ranked = db.select(
+        UserActivity.id,
+        db.func.row_number().over(
+            partition_by=UserActivity.user_id,
+            order_by=(UserActivity.timestamp.desc(), UserActivity.id.desc())
+        ).label('position')
+    ).where(UserActivity.user_id.in_(user_ids)).subquery()
+    
+    return UserActivity.query.join(ranked, ranked.c.id == UserActivity.id).filter(
+        ranked.c.position <= limit
+    ).order_by(UserActivity.user_id, UserActivity.timestamp.desc(), UserActivity.id.desc()).all()
+
+def serialize_activity(activity):
+    return {
+        'id': activity.id,
+        'user': activity.user.username,
+        'action': activity.action,
+        'details': activity.details,
+        'timestamp': activity.timestamp.isoformat()
+    }
+
+@app.route('/api/customers')
 @login_required
-def generate_invoice(username, customer_name):
+def search_customers():
+    """Autocomplete for customer name inputs"""
+    prefix = request.args.get('prefix', '')
+    if not normalize_customer_name(prefix):
+        return jsonify([])
+    try:
+        limit = min(int(request.args.get('limit', 10)), 50)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    return jsonify(customer_index.search(prefix, limit))
+
+@app.route('/api/activities')
+@login_required
+def list_activities():
+    """Activity log, newest first, paged by a (timestamp, id) cursor instead of OFFSET"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 200)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    
+    query = UserActivity.query.options(db.joinedload(UserActivity.user))
     if current_user.role != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
+        # Regular users only see their own activity
+        query = query.filter(UserActivity.user_id == current_user.id)
+    elif request.args.get('user_id'):
+        query = query.filter(UserActivity.user_id == request.args.get('user_id', type=int))
     
-    # Get all records for this customer
-    records = GameRecord.query.join(Table).filter(
-        Table.owner == username,
-        GameRecord.customer_name == customer_name,
-        GameRecord.confirmed == True,
-        GameRecord.archived == False
-    ).order_by(GameRecord.start_time.desc()).all()
+    cursor = request.args.get('before')
+    if cursor:
+        try:
+            timestamp, activity_id = cursor.rsplit(',', 1)
+            position = (datetime.fromisoformat(timestamp), int(activity_id))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(db.tuple_(UserActivity.timestamp, UserActivity.id) < position)
     
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
+    activities = query.order_by(UserActivity.timestamp.desc(), UserActivity.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(activities) > limit:
+        activities = activities[:limit]
+        next_cursor = f"{activities[-1].timestamp.isoformat()},{activities[-1].id}"
+    
+    return jsonify({
+        'activities': [serialize_activity(activity) for activity in activities],
+        'next': next_cursor
+    })
+
+# Rendered reports are cached on disk under a hash of their content
+REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR') or os.path.join(app.instance_path, 'reports')
+REPORT_CACHE_MAX_FILES = int(os.getenv('REPORT_CACHE_MAX_FILES', 200))
+# How often a browser sent to a pending report's download link reloads it
+REPORT_RETRY_SECONDS = 2
+
+report_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS,
+                                     thread_name_prefix='report')
+report_jobs = {}
+report_jobs_lock = threading.Lock()
+
+def report_key(kind, payload):
+    """Content hash of a report: the same kind and rows always map to the same file"""
+    encoded = json.dumps([kind, payload], sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+def report_path(key):
+    return os.path.join(REPORT_CACHE_DIR, f'{key}.pdf')
+
+def load_pdf_reports():
+    """The ReportLab renderers, imported on first use: most workers never render a PDF"""
+    import pdf_reports
+    return pdf_reports
+
+def render_report_file(render, payload, path):
+    """Render into a temporary file and move it into place, so readers never see half a PDF"""
+    if isinstance(render, str):  # The name of a renderer in pdf_reports
+        render = getattr(load_pdf_reports(), render)
+    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=REPORT_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            render(output, **payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    prune_report_cache()
+
+def prune_report_cache():
+    """Remove the least recently used reports beyond REPORT_CACHE_MAX_FILES"""
+    paths = [os.path.join(REPORT_CACHE_DIR, name) for name in os.listdir(REPORT_CACHE_DIR)
+             if name.endswith('.pdf')]
+    if len(paths) <= REPORT_CACHE_MAX_FILES:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:len(paths) - REPORT_CACHE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def submit_report(kind, render, payload, download_name):
+    """Queue a report unless it is cached or already rendering; returns its job id"""
+    key = report_key(kind, payload)
+    path = report_path(key)
+    with report_jobs_lock:
+        job = report_jobs.get(key)
+        future = job['future'] if job else None
+        if os.path.exists(path):
+            os.utime(path)  # Keeps frequently downloaded reports out of pruning
+        elif future is None or future.done():
+            # Nothing cached, nothing running (or the last attempt failed): render it
+            future = report_executor.submit(render_report_file, render, payload, path)
+        report_jobs[key] = {'future': future, 'download_name': download_name}
+        
+        # Forget finished jobs once the table grows; their files stay in the cache
+        if len(report_jobs) > REPORT_CACHE_MAX_FILES:
+            for old_key in [k for k, j in report_jobs.items() if k != key and (j['future'] is None or j['future'].done())]:
+                del report_jobs[old_key]
+    return key
+
+def report_status(key):
+    """'ready', 'pending' or 'failed' (with the error), or None for an unknown job"""
+    if os.path.exists(report_path(key)):
+        return 'ready', None
+    job = report_jobs.get(key)
+    if job is None or job['future'] is None:
+        return None, None
+    if not job['future'].done():
+        return 'pending', None
+    error = job['future'].exception()
+    if error is not None:
+        return 'failed', str(error)
+    return None, None
+
+def report_job_json(key):
+    status, error = report_status(key)
+    body = {
+        'job_id': key,
+        'status': status,
+        'status_url': url_for('report_job', job_id=key),
+        'download_url': url_for('download_report', job_id=key)
+    }
+    if error:
+        body['error'] = error
+    return body
+
+def send_report(key):
+    job = report_jobs.get(key)
+    return send_file(
+        report_path(key),
+        as_attachment=True,
+        download_name=job['download_name'] if job else f'report_{key[:12]}.pdf',
+        mimetype='application/pdf'
+    )
+
+def report_response(kind, render, payload, download_name):
+    """Queue a report and answer with its job (?async=1) or, for plain links, the file once ready
+
+    Nothing here waits on the render: a plain link to a report that is not ready yet is
+    redirected to its download link, which reloads itself until the file is there.
+    """
+    key = submit_report(kind, render, payload, download_name)
+    if not request.args.get('async'):
+        if report_status(key)[0] == 'ready':
+            return send_report(key)
+        return redirect(url_for('download_report', job_id=key), 303)
+    
+    body = report_job_json(key)
+    if body['status'] == 'failed':
+        return jsonify(body), 500
+    return jsonify(body), 200 if body['status'] == 'ready' else 202
+
+def check_job_id(job_id):
+    # Job ids are report hashes and double as cache file names
+    if not re.fullmatch(r'[0-9a-f]{64}', job_id):
+        abort(404)
+
+@app.route('/admin/reports/<job_id>')
+@login_required
+def report_job(job_id):
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    check_job_id(job_id)
     
-    # Title
-    styles = getSampleStyleSheet()
-    elements.append(Paragraph(f"Invoice for {customer_name}", styles['Title']))
-    elements.append(Paragraph(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
+    body = report_job_json(job_id)
+    if body['status'] is None:
+        return jsonify({'error': 'Unknown report job'}), 404
+    return jsonify(body)
+
+@app.route('/admin/reports/<job_id>/download')
+@login_required
+def download_report(job_id):
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    check_job_id(job_id)
     
-    # Table data
-    data = [['Date', 'Table', 'Duration', 'Price', 'Status']]
+    body = report_job_json(job_id)
+    if body['status'] == 'ready':
+        return send_report(job_id)
+    if body['status'] is None:
+        return jsonify({'error': 'Unknown report job'}), 404
+    if body['status'] == 'failed':
+        return jsonify(body), 500
+    # Still rendering: browsers follow Refresh, scripts can honour Retry-After
+    response = jsonify(body)
+    response.headers['Retry-After'] = str(REPORT_RETRY_SECONDS)
+    response.headers['Refresh'] = str(REPORT_RETRY_SECONDS)
+    return response, 202
+
+# Rows fetched per round trip while rendering a customer invoice
+INVOICE_BATCH_SIZE = 250
+
+def invoice_row(record):
+    """One finished game as a customer invoice row"""
+    duration = record.end_time - record.start_time
+    hours = duration.total_seconds() / 3600
+    return [
+        record.start_time.strftime('%Y-%m-%d %H:%M'),
+        table_registry.get(record.table_id).name,
+        f"{hours:.1f} hours",
+        f"{record.price:.2f} MAD",
+        record.payment_status
+    ]
+
+def invoice_rows(records):
+    """Format finished games as customer invoice rows plus paid and loan totals"""
+    rows = []
     total_paid = 0
     total_loan = 0
     
     for record in records:
         if record.end_time:  # Only include finished games
-            duration = record.end_time - record.start_time
-            hours = duration.total_seconds() / 3600
-            
-            data.append([
-                record.start_time.strftime('%Y-%m-%d %H:%M'),
-                Table.query.get(record.table_id).name,
-                f"{hours:.1f} hours",
-                f"{record.price:.2f} MAD",
-                record.payment_status
-            ])
+            rows.append(invoice_row(record))
             
             if record.payment_status == 'paid':
                 total_paid += record.price
             else:
                 total_loan += record.price
     
-    # Add totals
-    data.append(['', '', '', 'Total Paid:', f"{total_paid:.2f} MAD"])
-    data.append(['', '', '', 'Total Loan:', f"{total_loan:.2f} MAD"])
-    
-    # Create table
-    table = ReportTable(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -2), (-1, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 12),
-        ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    
-    buffer.seek(0)
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=f'invoice_{username}_{customer_name}_{datetime.now().strftime("%Y%m%d")}.pdf',
-        mimetype='application/pdf'
+    return rows, total_paid, total_loan
+
+def invoice_criteria(owner, customer_name, start=None, end=None):
+    criteria = [
+        Table.owner == owner,
+        GameRecord.customer_name == customer_name,
+        GameRecord.confirmed == True
+    ]
+    if start:
+        criteria.append(GameRecord.start_time >= start)
+    if end:
+        criteria.append(GameRecord.start_time < end)
+    return criteria
+
+def oldest_open_loan(owner, customer_name):
+    """Start of the customer's oldest unpaid game: payments settle games oldest first, so
+    everything from there on is what they ran up since they last paid"""
+    return db.session.query(db.func.min(GameRecord.start_time)).join(Table).filter(
+        *invoice_criteria(owner, customer_name),
+        GameRecord.payment_status == 'loan'
+    ).scalar()
+
+def customer_invoice_criteria(owner, customer_name, start, end):
+    return (
+        *invoice_criteria(owner, customer_name, start, end),
+        GameRecord.end_time != None  # Only include finished games
+    )
+
+def customer_invoice_summary(owner, customer_name, start, end):
+    """Totals of an invoice plus a fingerprint of its rows, read in the request for the cache key"""
+    is_paid = GameRecord.payment_status == 'paid'
+    games, last_id, last_end, total_paid, total_loan = db.session.query(
+        db.func.count(GameRecord.id),
+        db.func.max(GameRecord.id),
+        db.func.max(GameRecord.end_time),
+        db.func.coalesce(db.func.sum(db.case((is_paid, GameRecord.price), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case((is_paid, 0), else_=GameRecord.price)), 0)
+    ).select_from(GameRecord).join(Table).filter(*customer_invoice_criteria(owner, customer_name, start, end)).one()
+    return {
+        'total_paid': round(total_paid, 2),
+        'total_loan': round(total_loan, 2),
+        # Any game added, removed, repriced, paid or ended, by any process, changes these
+        'data_version': [games, last_id, last_end and last_end.isoformat()]
+    }
+
+def render_customer_invoice(output, owner, customer_name, start, end, scope, total_paid, total_loan, data_version):
+    """Render an invoice straight from the database, streaming its rows through a cursor"""
+    # data_version only feeds the report cache key
+    with app.app_context():
+        criteria = customer_invoice_criteria(owner, customer_name, start and datetime.fromisoformat(start),
+                                             end and datetime.fromisoformat(end))
+        records = db.session.execute(db.select(
+            GameRecord.start_time, GameRecord.end_time, GameRecord.price,
+            GameRecord.payment_status, GameRecord.table_id
+        ).join(Table).where(*criteria).order_by(GameRecord.start_time.desc()).execution_options(
+            yield_per=INVOICE_BATCH_SIZE))
+        load_pdf_reports().render_invoice(output, customer_name, (invoice_row(record) for record in records),
+                                          total_paid, total_loan, scope)
+
+@app.route('/admin/invoice/<username>/<customer_name>')
+@login_required
+def generate_invoice(username, customer_name):
+    """Customer invoice; ?start= and ?end= (YYYY-MM-DD) or ?since=last_payment narrow it down"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    customer_name = canonical_customer_name(customer_name)
+    try:
+        start = parse_day(request.args.get('start'))
+        end = parse_day(request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'Invalid date, expected YYYY-MM-DD'}), 400
+    start = start and datetime(start.year, start.month, start.day)
+    end = end and day_bounds(end)[1]
+    
+    scope = None
+    if request.args.get('since') == 'last_payment':
+        start = oldest_open_loan(username, customer_name)
+        if start is None:
+            return jsonify({'error': 'Customer has no outstanding loan'}), 404
+        scope = f"Games since last payment ({start.strftime('%Y-%m-%d %H:%M')})"
+    elif request.args.get('since'):
+        return jsonify({'error': 'since must be last_payment'}), 400
+    elif start or end:
+        scope = (f"Games from {start.strftime('%Y-%m-%d') if start else 'the beginning'} "
+                 f"to {(end - timedelta(days=1)).strftime('%Y-%m-%d') if end else 'today'}")
+    
+    return report_response('invoice', render_customer_invoice, {
+        'owner': username,
+        'customer_name': customer_name,
+        'start': start and start.isoformat(),
+        'end': end and end.isoformat(),
+        'scope': scope,
+        **customer_invoice_summary(username, customer_name, start, end)
+    }, f'invoice_{username}_{customer_name}_{datetime.now().strftime("%Y%m%d")}.pdf')
+
+# Invoice PDFs are CPU-bound in ReportLab, so batches render in worker processes
+INVOICE_PROCESSES = int(os.getenv('INVOICE_PROCESSES', os.cpu_count() or 2))
+invoice_pool = None
+invoice_pool_lock = threading.Lock()
+
+def get_invoice_pool():
+    """The invoice process pool, started on first use"""
+    global invoice_pool
+    with invoice_pool_lock:
+        if invoice_pool is None:
+            # Fresh interpreters rather than forks of this multi-threaded server process
+            invoice_pool = ProcessPoolExecutor(max_workers=INVOICE_PROCESSES,
+                                               mp_context=multiprocessing.get_context('forkserver'))
+            atexit.register(invoice_pool.shutdown, cancel_futures=True)
+        return invoice_pool
+
+def render_invoice_file(path, payload):
+    """Process pool entry point: render one invoice to a file"""
+    load_pdf_reports().render_invoice(path, **payload)
+    return path
+
+class ZipStream:
+    """Write-only file object that hands what zipfile wrote so far to a streaming response"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def debtor_invoices(owner=None):
+    """Invoice payloads of every customer with an outstanding loan, from one query"""
+    query = db.session.query(GameRecord, CustomerBalance.owner).join(Table).join(CustomerBalance, db.and_(
+        CustomerBalance.owner == Table.owner,
+        CustomerBalance.customer_name == GameRecord.customer_name
+    )).filter(
+        CustomerBalance.loan_total > 0,
+        GameRecord.confirmed == True
     )
+    if owner:
+        query = query.filter(CustomerBalance.owner == owner)
+    
+    records = {}
+    for record, record_owner in query.order_by(GameRecord.start_time.desc()):
+        records.setdefault((record_owner, record.customer_name), []).append(record)
+    
+    invoices = []
+    for (record_owner, customer_name), customer_records in sorted(records.items()):
+        rows, total_paid, total_loan = invoice_rows(customer_records)
+        invoices.append((record_owner, customer_name, {
+            'customer_name': customer_name,
+            'rows': rows,
+            'total_paid': total_paid,
+            'total_loan': total_loan
+        }))
+    return invoices
+
+def safe_file_name(name):
+    return re.sub(r'[^\w.-]+', '_', name).strip('_') or 'customer'
+
+@app.route('/admin/invoices/batch')
+@login_required
+def batch_invoices():
+    """Invoices of all customers with an outstanding loan, streamed as one ZIP"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    owner = request.args.get('owner')
+    invoices = debtor_invoices(owner)
+    if not invoices:
+        return jsonify({'error': 'No customers with outstanding loans'}), 404
+    date = datetime.now().strftime('%Y%m%d')
+    
+    def generate():
+        with tempfile.TemporaryDirectory(prefix='invoices-') as workdir:
+            pool = get_invoice_pool()
+            futures = {}
+            for position, (invoice_owner, customer_name, payload) in enumerate(invoices):
+                path = os.path.join(workdir, f'{position}.pdf')
+                name = f'invoice_{invoice_owner}_{safe_file_name(customer_name)}_{date}.pdf'
+                futures[pool.submit(render_invoice_file, path, payload)] = name
+            
+            # Each PDF joins the archive, and leaves the disk, as soon as it is rendered
+            stream = ZipStream()
+            with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for future in as_completed(futures):
+                    path = future.result()
+                    archive.write(path, futures[future])
+                    os.remove(path)
+                    yield stream.drain()
+            yield stream.drain()
+    
+    return Response(generate(), mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename=invoices_{owner or "all"}_{date}.zip',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/api/active_games')
 @login_required
 def get_active_games():
+    # Read the tag before querying so a concurrent write can only make it stale, never too new.
+    # The minute is part of it so running prices are never more than a minute old.
+    etag = game_state.etag('active', 'all' if current_user.role == 'admin' else current_user.username,
+                           int(time.time() // 60))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
     if current_user.role != 'admin':
         # Regular users only see their own games
         games = GameRecord.query.join(Table).filter(
@@ -337,22 +2066,42 @@ def get_active_games():
         # Admins see all active games
         games = GameRecord.query.filter_by(state='inprogress').all()
     
-    active_games = []
-    for game in games:
-        table = Table.query.get(game.table_id)
-        duration = datetime.now() - game.start_time
-        hours = duration.total_seconds() / 3600
-        
-        active_games.append({
-            'id': game.id,
-            'table_name': table.name,
-            'table_owner': table.owner,
-            'start_time': game.start_time.strftime('%Y-%m-%d %H:%M'),
-            'duration': f"{hours:.1f} hours",
-            'price': f"{game.price:.2f} MAD"
-        })
+    return with_validators(jsonify(serialize_active_games(games)), etag)
+
+@app.route('/api/active_games/stream')
+@login_required
+def stream_active_games():
+    # Regular users only see their own games
+    owner = None if current_user.role == 'admin' else current_user.username
     
-    return jsonify(active_games)
+    # Subscribe before reading the snapshot so no change can slip in between
+    subscription = game_events.subscribe()
+    query = GameRecord.query.filter_by(state='inprogress')
+    if owner:
+        query = query.join(Table).filter(Table.owner == owner)
+    snapshot = serialize_active_games(query.all())
+    db.session.remove()
+    
+    def stream():
+        try:
+            yield format_sse('snapshot', snapshot)
+            deadline = time.monotonic() + STREAM_MAX_SECONDS
+            while time.monotonic() < deadline and game_events.is_subscribed(subscription):
+                try:
+                    event = subscription.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if owner and event['owner'] != owner:
+                    continue
+                yield format_sse(event['type'], event['game'])
+        finally:
+            game_events.unsubscribe(subscription)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/record/new', methods=['POST'])
 @login_required
@@ -360,6 +2109,12 @@ def new_record():
     table_id = request.form.get('table_id')
     if not table_id:
         return jsonify({'error': 'No table specified'}), 400
+    
+    # Rejected before inserting: a game on an unknown table breaks every active-games view
+    table = table_registry.get(table_id) if table_id.isdigit() else None
+    if table is None:
+        return jsonify({'error': 'Unknown table'}), 400
+    table_id = table.id
         
     # Check if table already has an active game
     active_game = GameRecord.query.filter_by(
@@ -379,6 +2134,7 @@ def new_record():
     
     db.session.add(record)
     db.session.commit()
+    publish_game_change(record)
     
     return jsonify({'success': True})
 
@@ -395,7 +2151,11 @@ def update_record(record_id):
     if 'end_game' in request.form:
         record.end_time = datetime.now()
         record.state = 'finished'
+        # A price typed in during the game wins over the tariff
+        if not record.price:
+            record.price = calculate_price(record.start_time, record.end_time, record.table_id)
         db.session.commit()
+        publish_game_change(record)
         return jsonify({'success': True})
     
     # Update price
@@ -403,13 +2163,14 @@ def update_record(record_id):
         try:
             record.price = float(request.form['price'])
             db.session.commit()
+            publish_game_change(record)
             return jsonify({'success': True})
         except ValueError:
             return jsonify({'success': False, 'error': 'Invalid price'}), 400
     
     # Update customer name
     if 'customer_name' in request.form:
-        record.customer_name = request.form['customer_name']
+        assign_customer(record, request.form['customer_name'])
     
     # Update payment status
     if 'payment_status' in request.form:
@@ -425,16 +2186,50 @@ def update_record(record_id):
         record.confirmed = True
     
     db.session.commit()
+    if record.state == 'inprogress':
+        publish_game_change(record)
     return jsonify({'success': True})
 
+def game_prices(*criteria):
+    """Running price and timestamps of the matching games, read as plain rows in one query"""
+    games = db.session.query(
+        GameRecord.id, GameRecord.table_id, GameRecord.start_time, GameRecord.end_time, GameRecord.price
+    ).select_from(GameRecord).join(Table).filter(*criteria).order_by(GameRecord.id).all()
+    return [{
+        'id': game.id,
+        'price': price,
+        'started_at': game.start_time.isoformat(),
+        'ended_at': game.end_time.isoformat() if game.end_time else None
+    } for game, price in zip(games, running_prices(games))]
+
+@app.route('/api/prices')
+@login_required
+def get_current_prices():
+    """Running prices of every open game the caller can see"""
+    owner = None if current_user.role == 'admin' else current_user.username
+    # Tariff prices move with the clock, so a tag is only good for the current minute
+    etag = game_state.etag('prices', owner or 'all', int(time.time() // 60))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    criteria = [GameRecord.state == 'inprogress']
+    if owner:
+        criteria.append(Table.owner == owner)
+    return with_validators(jsonify(game_prices(*criteria)), etag)
+
 @app.route('/get_price/<int:record_id>')
 @login_required
 def get_current_price(record_id):
-    record = GameRecord.query.get_or_404(record_id)
-    return jsonify({
-        'price': record.price,
-        'duration': str(datetime.now() - record.start_time).split('.')[0]  # Format as HH:MM:SS
-    })
+    etag = game_state.etag('price', record_id, int(time.time() // 60))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    prices = game_prices(GameRecord.id == record_id)
+    if not prices:
+        abort(404)
+    return with_validators(jsonify({key: prices[0][key] for key in ('price', 'started_at', 'ended_at')}), etag)
 
 @app.route('/record/delete/<int:id>', methods=['POST'])
 @login_required
@@ -445,8 +2240,88 @@ def delete_record(id):
     record = GameRecord.query.get_or_404(id)
     db.session.delete(record)
     db.session.commit()
+    publish_game_change(record, deleted=True)
     return jsonify({'success': True})
 
+def lock_for_writes():
+    """Serialize writers for the rest of the transaction on SQLite, which has no row locks"""
+    if db.engine.dialect.name != 'sqlite':
+        return
+    dbapi_connection = db.session.connection().connection.dbapi_connection
+    # Once a write is pending SQLite already holds the write lock
+    if not dbapi_connection.in_transaction:
+        dbapi_connection.execute('BEGIN IMMEDIATE')
+
+def update_game_records(ids, **values):
+    """Set-based UPDATE of live games that keeps the balance ledger in step"""
+    with db.session.no_autoflush:
+        before = stored_balance_entries(ids)
+        db.session.execute(db.update(GameRecord).where(GameRecord.id.in_(ids)).values(**values),
+                           execution_options={'synchronize_session': 'fetch'})
+        apply_balance_changes(before, stored_balance_entries(ids), ids)
+    db.session.info['games_changed'] = True
+
+def allocate_loan_payment(owner, customer_name, amount, paid_by):
+    """Pay a customer's loan games oldest first; the last game is split if only partly covered"""
+    # Row locks on PostgreSQL; SQLite callers hold the write lock from lock_for_writes
+    loans = db.session.execute(db.select(
+        GameRecord.id, GameRecord.price, GameRecord.table_id, GameRecord.start_time, GameRecord.end_time,
+        GameRecord.customer_name, GameRecord.customer_id
+    ).join(Table).where(
+        Table.owner == owner,
+        GameRecord.customer_name == customer_name,
+        GameRecord.payment_status == 'loan'
+    ).order_by(GameRecord.start_time, GameRecord.id).with_for_update(of=GameRecord)).all()
+    
+    remaining_amount = amount
+    covered = []
+    split = None
+    for loan in loans:
+        if remaining_amount <= 0:
+            break
+        if remaining_amount >= loan.price:
+            covered.append(loan.id)
+            remaining_amount -= loan.price
+        else:
+            split = loan
+            break
+    
+    if covered:
+        update_game_records(covered, payment_status='paid')
+    if split:
+        # Split the record into paid and loan parts
+        update_game_records([split.id], price=GameRecord.price - remaining_amount)
+        db.session.add(GameRecord(
+            table_id=split.table_id,
+            start_time=split.start_time,
+            end_time=split.end_time,
+            price=remaining_amount,
+            payment_status='paid',
+            state='finished',
+            customer_name=split.customer_name,
+            customer_id=split.customer_id,
+            created_by=paid_by,
+            confirmed=True
+        ))
+        remaining_amount = 0
+    
+    return {
+        'customer_name': customer_name,
+        'owner': owner,
+        'applied': amount - remaining_amount,
+        'unapplied': remaining_amount,
+        'games_paid': len(covered)
+    }
+
+def parse_payment(data):
+    """(owner, canonical customer name, amount) from a payment request, or None if incomplete"""
+    customer_name = data.get('customer_name')
+    owner = data.get('owner')
+    amount = float(data.get('amount', 0))
+    if not all([customer_name, owner, amount]):
+        return None
+    return owner, canonical_customer_name(customer_name), amount
+
 @app.route('/admin/pay_loan', methods=['POST'])
 @login_required
 def pay_loan():
@@ -454,57 +2329,62 @@ def pay_loan():
         return jsonify({'error': 'Unauthorized'}), 403
     
     try:
-        data = request.get_json()
-        customer_name = data.get('customer_name')
-        owner = data.get('owner')
-        amount = float(data.get('amount', 0))
-        
-        if not all([customer_name, owner, amount]):
+        payment = parse_payment(request.get_json())
+        if not payment:
             return jsonify({'error': 'Missing required fields'}), 400
-            
-        # Get all loan records for this customer
-        loan_records = GameRecord.query.join(Table).filter(
-            Table.owner == owner,
-            GameRecord.customer_name == customer_name,
-            GameRecord.payment_status == 'loan',
-            GameRecord.archived == False
-        ).order_by(GameRecord.start_time).all()
-        
-        remaining_amount = amount
-        for record in loan_records:
-            if remaining_amount <= 0:
-                break
-                
-            if remaining_amount >= record.price:
-                record.payment_status = 'paid'
-                remaining_amount -= record.price
-            else:
-                # Split the record into paid and loan parts
-                new_record = GameRecord(
-                    table_id=record.table_id,
-                    start_time=record.start_time,
-                    end_time=record.end_time,
-                    price=remaining_amount,
-                    payment_status='paid',
-                    state='finished',
-                    customer_name=record.customer_name,
-                    created_by=current_user.username,
-                    confirmed=True
-                )
-                record.price -= remaining_amount
-                db.session.add(new_record)
-                remaining_amount = 0
+        owner, customer_name, amount = payment
         
+        lock_for_writes()
+        result = allocate_loan_payment(owner, customer_name, amount, current_user.username)
         db.session.commit()
         log_user_activity(current_user, 'Processed loan payment', 
                          f'Customer: {customer_name}, Owner: {owner}, ' +
                          f'Amount: {amount}')
-        return jsonify({'message': 'Loan payment processed successfully'}), 200
+        return jsonify({'message': 'Loan payment processed successfully', **result}), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/admin/pay_loans', methods=['POST'])
+@login_required
+def pay_loans():
+    """Settle several customers' loan payments in one transaction"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        data = request.get_json()
+        entries = data.get('payments') if isinstance(data, dict) else None
+        if not entries or not isinstance(entries, list):
+            return jsonify({'error': 'Expected a non-empty payments list'}), 400
+        
+        payments = []
+        for position, entry in enumerate(entries):
+            payment = parse_payment(entry) if isinstance(entry, dict) else None
+            if not payment:
+                return jsonify({'error': f'Missing required fields in payment {position}'}), 400
+            payments.append(payment)
+        
+        # Same locking order in every request, so two bulk payments can't deadlock on PostgreSQL
+        lock_for_writes()
+        results = [None] * len(payments)
+        for position in sorted(range(len(payments)), key=lambda position: payments[position][:2]):
+            owner, customer_name, amount = payments[position]
+            results[position] = allocate_loan_payment(owner, customer_name, amount, current_user.username)
+        db.session.commit()
+        
+        for owner, customer_name, amount in payments:
+            log_user_activity(current_user, 'Processed loan payment', 
+                             f'Customer: {customer_name}, Owner: {owner}, ' +
+                             f'Amount: {amount}')
+        return jsonify({'message': f'{len(payments)} loan payments processed successfully',
+                        'payments': results}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/start_game', methods=['POST'])
 @login_required
 def start_game():
@@ -520,19 +2400,20 @@ def start_game():
         if not table:
             return jsonify({'error': 'Table not found'}), 404
             
-        if table.state == 'occupied':
+        # A table is occupied while it has a game in progress
+        if GameRecord.query.filter_by(table_id=table.id, state='inprogress').first():
             return jsonify({'error': 'Table is already occupied'}), 400
             
         game = GameRecord(
-            table_id=table_id,
+            table_id=table.id,
             start_time=datetime.now(),
-            customer_name=customer_name,
             created_by=current_user.username
         )
-        table.state = 'occupied'
+        assign_customer(game, customer_name)
         
         db.session.add(game)
         db.session.commit()
+        publish_game_change(game)
         
         log_user_activity(current_user, 'Started game', 
                          f'Table: {table.name}, Customer: {customer_name}')
@@ -557,8 +2438,8 @@ def end_game():
             return jsonify({'error': 'Table not found'}), 404
             
         game = GameRecord.query.filter_by(
-            table_id=table_id,
-            state='active'
+            table_id=table.id,
+            state='inprogress'
         ).first()
         
         if not game:
@@ -567,10 +2448,12 @@ def end_game():
         game.end_time = datetime.now()
         game.state = 'finished'
         game.payment_status = payment_status
-        game.price = calculate_price(game.start_time, game.end_time)
-        table.state = 'available'
+        # A price typed in during the game wins over the tariff
+        if not game.price:
+            game.price = calculate_price(game.start_time, game.end_time, game.table_id)
         
         db.session.commit()
+        publish_game_change(game)
         
         log_user_activity(current_user, 'Ended game', 
                          f'Table: {table.name}, Customer: {game.customer_name}, ' +
@@ -601,65 +2484,85 @@ def confirm_game(game_id):
 
 def get_user_totals(owner):
     """Calculate total paid and loan amounts for a user's tables"""
-    records = GameRecord.query.join(Table).filter(
-        Table.owner == owner,
-        GameRecord.confirmed == True,
-        GameRecord.archived == False
-    ).all()
+    stats = get_all_user_totals([owner])[owner]
+    return stats['total_paid'], stats['total_loan'], stats['customer_stats']
+
+def get_all_user_totals(owners):
+    """Calculate paid and loan totals for several owners in one pass"""
+    return summarize_user_totals(get_customer_activity(owners), owners)
+
+def summarize_user_totals(activity, owners):
+    """Fold grouped (owner, customer) rows into per-owner totals and customer stats"""
+    totals = {owner: {'total_paid': 0, 'total_loan': 0, 'customer_stats': {}} for owner in owners}
     
-    total_paid = 0
-    total_loan = 0
-    customer_stats = {}
+    for row in activity:
+        # Customers with only unconfirmed games don't count towards the totals
+        if not row.confirmed_games:
+            continue
+        stats = totals[row.owner]
+        stats['total_paid'] += row.paid
+        stats['total_loan'] += row.loan
+        stats['customer_stats'][row.customer_name] = {'paid': row.paid, 'loan': row.loan}
+    
+    return totals
 
-    for record in records:
-        if record.payment_status == 'paid':
-            total_paid += record.price
-        else:
-            total_loan += record.price
-        
-        # Update customer stats
-        if record.customer_name not in customer_stats:
-            customer_stats[record.customer_name] = {'paid': 0, 'loan': 0}
-        
-        if record.payment_status == 'paid':
-            customer_stats[record.customer_name]['paid'] += record.price
-        else:
-            customer_stats[record.customer_name]['loan'] += record.price
+def get_customer_activity(owners):
+    """Paid total, loan total and last activity per (owner, customer), read from the balance ledger"""
+    return customer_activity_query(owners).all()
 
-    return total_paid, total_loan, customer_stats
+def customer_activity_query(owners):
+    return db.session.query(
+        CustomerBalance.owner,
+        CustomerBalance.customer_name,
+        CustomerBalance.paid_total.label('paid'),
+        CustomerBalance.loan_total.label('loan'),
+        CustomerBalance.confirmed_count.label('confirmed_games'),
+        CustomerBalance.last_activity
+    ).filter(CustomerBalance.owner.in_(owners))
+
+def customer_activity_from_games():
+    """The balance ledger recomputed from game_record, for rebuilds and reconciliation"""
+    is_paid = GameRecord.payment_status == 'paid'
+    paid = db.case((db.and_(GameRecord.confirmed == True, is_paid), GameRecord.price), else_=0)
+    loan = db.case((db.and_(GameRecord.confirmed == True, db.not_(is_paid)), GameRecord.price), else_=0)
+    confirmed = db.case((GameRecord.confirmed == True, 1), else_=0)
+    
+    customer_name = db.func.coalesce(GameRecord.customer_name, '')
+    
+    # Last activity covers every unarchived game, totals only confirmed ones
+    return db.session.query(
+        Table.owner,
+        customer_name.label('customer_name'),
+        db.func.max(GameRecord.customer_id).label('customer_id'),
+        db.func.coalesce(db.func.sum(paid), 0).label('paid'),
+        db.func.coalesce(db.func.sum(loan), 0).label('loan'),
+        db.func.count().label('games'),
+        db.func.sum(confirmed).label('confirmed_games'),
+        db.func.max(GameRecord.start_time).label('last_activity')
+    ).select_from(GameRecord).join(Table).group_by(Table.owner, customer_name).all()
 
-def generate_daily_invoice(owner, date):
-    """Generate invoice for a specific owner and date"""
+def daily_invoice_data(owner, date):
+    """Rows and totals of the daily report for a specific owner and date"""
     # Get all confirmed records for the specified owner and date
+    day_start, day_end = day_bounds(date)
     records = GameRecord.query.join(Table).filter(
         Table.owner == owner,
         GameRecord.confirmed == True,
-        GameRecord.archived == False,
-        db.func.date(GameRecord.start_time) == date
+        GameRecord.start_time >= day_start,
+        GameRecord.start_time < day_end
     ).all()
 
-    # Create a BytesIO buffer to store the PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-
-    # Add title
-    styles = getSampleStyleSheet()
-    title = Paragraph(f"Daily Report - {owner.capitalize()} - {date.strftime('%Y-%m-%d')}", styles['Title'])
-    elements.append(title)
-
-    # Prepare data for the table
-    data = [['Table', 'Customer', 'Start Time', 'End Time', 'Duration', 'Price', 'Status']]
+    rows = []
     total_paid = 0
     total_loan = 0
 
     # Add records to data
     for record in records:
-        table = Table.query.get(record.table_id)
+        table = table_registry.get(record.table_id)
         duration = record.end_time - record.start_time if record.end_time else datetime.now() - record.start_time
         duration_str = str(duration).split('.')[0]  # Remove microseconds
         
-        data.append([
+        rows.append([
             table.name,
             record.customer_name,
             record.start_time.strftime('%H:%M'),
@@ -674,34 +2577,13 @@ def generate_daily_invoice(owner, date):
         else:
             total_loan += record.price
 
-    # Add summary row
-    data.append(['', '', '', '', '', '', ''])
-    data.append(['Total Paid:', f"{total_paid:.2f} MAD", '', '', '', '', ''])
-    data.append(['Total Loan:', f"{total_loan:.2f} MAD", '', '', '', '', ''])
-    data.append(['Total:', f"{(total_paid + total_loan):.2f} MAD", '', '', '', '', ''])
-
-    # Create table
-    table = ReportTable(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -4), (-1, -1), colors.beige),
-        ('TEXTCOLOR', (0, -4), (-1, -1), colors.black),
-        ('FONTNAME', (0, -4), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -4), (-1, -1), 12),
-        ('ALIGN', (0, -4), (-1, -1), 'LEFT'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(table)
-
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    return {
+        'owner': owner,
+        'date': date.strftime('%Y-%m-%d'),
+        'rows': rows,
+        'total_paid': total_paid,
+        'total_loan': total_loan
+    }
 
 @app.route('/admin/daily_invoice/<owner>')
 @login_required
@@ -710,14 +2592,8 @@ def generate_daily_owner_invoice(owner):
         return jsonify({'error': 'Unauthorized'}), 403
     
     date = datetime.now()
-    buffer = generate_daily_invoice(owner, date)
-    
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=f'daily_invoice_{owner}_{date.strftime("%Y%m%d")}.pdf',
-        mimetype='application/pdf'
-    )
+    return report_response('daily', 'render_daily_invoice', daily_invoice_data(owner, date),
+                           f'daily_invoice_{owner}_{date.strftime("%Y%m%d")}.pdf')
 
 @app.route('/admin/daily_invoice/all')
 @login_required
@@ -726,37 +2602,20 @@ def generate_daily_all_invoice():
         return jsonify({'error': 'Unauthorized'}), 403
     
     date = datetime.now()
-    
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    
-    # Title
-    styles = getSampleStyleSheet()
-    elements.append(Paragraph(f"Daily Report - All Workers", styles['Title']))
-    elements.append(Paragraph(f"Date: {date.strftime('%Y-%m-%d')}", styles['Normal']))
-    
-    # Generate report for each worker
+    start_of_day, end_of_day = day_bounds(date)
+    sections = []
     total_all_paid = 0
     total_all_loan = 0
     
     for owner in ['ayoub', 'ayman']:
-        elements.append(Paragraph(f"\n{owner.title()}'s Report", styles['Heading2']))
-        
-        start_of_day = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_day = date.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
         records = GameRecord.query.join(Table).filter(
             Table.owner == owner,
             GameRecord.confirmed == True,
             GameRecord.start_time >= start_of_day,
-            GameRecord.start_time <= end_of_day,
-            GameRecord.archived == False
+            GameRecord.start_time < end_of_day
         ).order_by(GameRecord.start_time.desc()).all()
         
-        # Table data
-        data = [['Time', 'Table', 'Customer', 'Duration', 'Price', 'Status']]
+        rows = []
         total_paid = 0
         total_loan = 0
         
@@ -765,9 +2624,9 @@ def generate_daily_all_invoice():
                 duration = record.end_time - record.start_time
                 hours = duration.total_seconds() / 3600
                 
-                data.append([
+                rows.append([
                     record.start_time.strftime('%H:%M'),
-                    Table.query.get(record.table_id).name,
+                    table_registry.get(record.table_id).name,
                     record.customer_name or 'N/A',
                     f"{hours:.1f} hours",
                     f"{record.price:.2f} MAD",
@@ -776,66 +2635,27 @@ def generate_daily_all_invoice():
                 
                 if record.payment_status == 'paid':
                     total_paid += record.price
-                    total_all_paid += record.price
                 else:
                     total_loan += record.price
-                    total_all_loan += record.price
-        
-        # Add worker totals
-        data.append(['', '', '', '', 'Total Paid:', f"{total_paid:.2f} MAD"])
-        data.append(['', '', '', '', 'Total Loan:', f"{total_loan:.2f} MAD"])
-        data.append(['', '', '', '', 'Total:', f"{(total_paid + total_loan):.2f} MAD"])
-        
-        # Create table
-        table = ReportTable(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, -3), (-1, -1), colors.lightgrey),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 12),
-            ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        elements.append(table)
-        elements.append(Paragraph("<br/><br/>", styles['Normal']))
-    
-    # Add grand total
-    elements.append(Paragraph("Grand Total", styles['Heading1']))
-    grand_total_data = [
-        ['', 'Total Paid', 'Total Loan', 'Total'],
-        ['All Workers', f"{total_all_paid:.2f} MAD", f"{total_all_loan:.2f} MAD", f"{(total_all_paid + total_all_loan):.2f} MAD"]
-    ]
-    
-    grand_total_table = ReportTable(grand_total_data)
-    grand_total_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(grand_total_table)
-    doc.build(elements)
-    buffer.seek(0)
+        
+        sections.append({'owner': owner, 'rows': rows, 'total_paid': total_paid, 'total_loan': total_loan})
+        total_all_paid += total_paid
+        total_all_loan += total_loan
     
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=f'daily_invoice_all_{date.strftime("%Y%m%d")}.pdf',
-        mimetype='application/pdf'
+    return report_response('daily_all', 'render_daily_all_invoice', {
+        'date': date.strftime('%Y-%m-%d'),
+        'sections': sections,
+        'total_all_paid': total_all_paid,
+        'total_all_loan': total_all_loan
+    }, f'daily_invoice_all_{date.strftime("%Y%m%d")}.pdf')
+
+def reset_day_criteria(day_end):
+    """Confirmed games of every day up to day_end, including days nobody reset; games still
+    on the table stay live"""
+    return (
+        GameRecord.confirmed == True,
+        GameRecord.state != 'inprogress',
+        GameRecord.start_time < day_end
     )
 
 @app.route('/admin/reset_day', methods=['POST'])
@@ -845,25 +2665,270 @@ def reset_day():
         return jsonify({'error': 'Unauthorized'}), 403
 
     try:
-        # Get all confirmed records for the current day
-        today = datetime.now().date()
-        records = GameRecord.query.filter(
-            GameRecord.confirmed == True,
-            GameRecord.archived == False,
-            db.func.date(GameRecord.start_time) == today
-        ).all()
-
-        # Archive the records
-        for record in records:
-            record.archived = True
+        # Move every confirmed, finished game up to the end of today to the history table
+        day_start, day_end = day_bounds(datetime.now())
+        criteria = reset_day_criteria(day_end)
+        # Every day with games moving out gets its rollup rebuilt: days nobody reset, and
+        # games confirmed after their day was closed, are included this way
+        days = {start_time.date() for start_time, in
+                db.session.query(GameRecord.start_time).filter(*criteria).distinct()}
+        archived = archive_game_records(*criteria)
+        for day in sorted(days | {day_start.date()}):
+            refresh_daily_summary(day)
         
         db.session.commit()
-        return jsonify({'message': 'Day reset successfully'}), 200
+        return jsonify({'message': 'Day reset successfully', 'archived': archived}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def parse_day(value, default=None):
+    """Parse a YYYY-MM-DD query argument"""
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def summary_report(start, end, owner=None):
+    """Totals per owner and per day from the rollup, for days in [start, end]"""
+    query = db.session.query(
+        DailySummary.day,
+        DailySummary.owner,
+        db.func.sum(DailySummary.paid_total),
+        db.func.sum(DailySummary.loan_total),
+        db.func.sum(DailySummary.game_count),
+        db.func.sum(DailySummary.minutes_played)
+    ).filter(DailySummary.day >= start, DailySummary.day <= end)
+    if owner:
+        query = query.filter(DailySummary.owner == owner)
+    rows = query.group_by(DailySummary.day, DailySummary.owner).order_by(DailySummary.day).all()
+    
+    owners = {}
+    days = []
+    for day, row_owner, paid, loan, games, minutes in rows:
+        totals = owners.setdefault(row_owner, {'paid': 0, 'loan': 0, 'games': 0, 'minutes': 0})
+        totals['paid'] += paid
+        totals['loan'] += loan
+        totals['games'] += games
+        totals['minutes'] += minutes
+        days.append({
+            'day': day.isoformat(),
+            'owner': row_owner,
+            'paid': paid,
+            'loan': loan,
+            'games': games,
+            'minutes': minutes
+        })
+    
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'total_paid': sum(totals['paid'] for totals in owners.values()),
+        'total_loan': sum(totals['loan'] for totals in owners.values()),
+        'owners': owners,
+        'days': days
+    }
+
+# Rows fetched per round trip by the exports, and so also the most they hold in memory
+EXPORT_BATCH_SIZE = 1000
+GAME_EXPORT_FIELDS = ['game_id', 'archived', 'table', 'owner', 'customer_name', 'start_time', 'end_time',
+                      'price', 'payment_status', 'state', 'confirmed', 'created_by']
+ACTIVITY_EXPORT_FIELDS = ['id', 'archived', 'username', 'action', 'details', 'timestamp']
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def export_response(rows, fields, export_format, name):
+    """Stream dict rows as CSV or JSON lines, sending a batch at a time as the cursor yields them"""
+    def generate():
+        buffer = StringIO()
+        writer = csv.DictWriter(buffer, fields)
+        if export_format == 'csv':
+            writer.writeheader()
+        count = 0
+        for row in rows:
+            row = {field: export_value(row[field]) for field in fields}
+            if export_format == 'csv':
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row) + '\n')
+            count += 1
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    extension, mimetype = {'csv': ('csv', 'text/csv'), 'jsonl': ('jsonl', 'application/x-ndjson')}[export_format]
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={name}_{datetime.now().strftime("%Y%m%d")}.{extension}',
+        'X-Accel-Buffering': 'no'
+    })
+
+def export_filters():
+    """Format and [start, end) datetimes from the export query string; raises ValueError"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        raise ValueError('format must be csv or jsonl')
+    start = parse_day(request.args.get('start'))
+    end = parse_day(request.args.get('end'))
+    return (export_format,
+            start and datetime(start.year, start.month, start.day),
+            end and day_bounds(end)[1])
+
+def exported_games(owner=None, customer_name=None, state=None, start=None, end=None):
+    """Archived then live games in start order, streamed from a server-side cursor"""
+    for model, archived in ((GameRecordHistory, True), (GameRecord, False)):
+        query = db.select(
+            (model.game_id if archived else model.id).label('game_id'),
+            db.literal(archived).label('archived'),
+            Table.name.label('table'),
+            Table.owner.label('owner'),
+            model.customer_name, model.start_time, model.end_time, model.price,
+            model.payment_status, model.state, model.confirmed, model.created_by
+        ).join(Table, Table.id == model.table_id)
+        if owner:
+            query = query.where(Table.owner == owner)
+        if customer_name:
+            query = query.where(model.customer_name == canonical_customer_name(customer_name))
+        if state:
+            query = query.where(model.state == state)
+        if start:
+            query = query.where(model.start_time >= start)
+        if end:
+            query = query.where(model.start_time < end)
+        
+        rows = db.session.execute(query.order_by(model.start_time, model.id).execution_options(
+            yield_per=EXPORT_BATCH_SIZE))
+        for row in rows:
+            yield row._mapping
+
+def exported_activities(user_id=None, start=None, end=None):
+    """Activity log entries in time order: the gzipped archive first, then the live table"""
+    for entry in read_archived_activities(since=start, user_id=user_id):
+        timestamp = datetime.fromisoformat(entry['timestamp'])
+        if end and timestamp >= end:
+            break
+        yield dict(entry, archived=True)
+    
+    query = db.select(
+        UserActivity.id, db.literal(False).label('archived'), User.username,
+        UserActivity.action, UserActivity.details, UserActivity.timestamp
+    ).join(User)
+    if user_id is not None:
+        query = query.where(UserActivity.user_id == user_id)
+    if start:
+        query = query.where(UserActivity.timestamp >= start)
+    if end:
+        query = query.where(UserActivity.timestamp < end)
+    
+    rows = db.session.execute(query.order_by(UserActivity.timestamp, UserActivity.id).execution_options(
+        yield_per=EXPORT_BATCH_SIZE))
+    for row in rows:
+        yield row._mapping
+
+@app.route('/admin/export/games')
+@login_required
+def export_games():
+    """Game records for accounting, e.g. ?start=2024-01-01&end=2024-12-31&owner=ayoub&format=jsonl"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        export_format, start, end = export_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    rows = exported_games(request.args.get('owner'), request.args.get('customer'),
+                          request.args.get('state'), start, end)
+    return export_response(rows, GAME_EXPORT_FIELDS, export_format, 'games')
+
+@app.route('/admin/export/activities')
+@login_required
+def export_activities():
+    """Activity log including archived entries, e.g. ?start=2024-01-01&user=ayoub"""
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        export_format, start, end = export_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = None
+    if request.args.get('user'):
+        user = User.query.filter_by(username=request.args.get('user')).first()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        user_id = user.id
+    
+    return export_response(exported_activities(user_id, start, end), ACTIVITY_EXPORT_FIELDS,
+                           export_format, 'activities')
+
+@app.route('/admin/activity_log/stats')
+@login_required
+def activity_log_stats():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(activity_log.stats())
+
+@app.route('/admin/summary/<period>')
+@login_required
+def period_summary(period):
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    today = datetime.now().date()
+    try:
+        if period == 'week':
+            # ISO week (Monday to Sunday) containing ?date=, default this week
+            day = parse_day(request.args.get('date'), today)
+            start = day - timedelta(days=day.weekday())
+            end = start + timedelta(days=6)
+        elif period == 'month':
+            # Calendar month given as ?month=YYYY-MM, default this month
+            month = request.args.get('month') or today.strftime('%Y-%m')
+            start = datetime.strptime(month, '%Y-%m').date()
+            end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        elif period == 'range':
+            start = parse_day(request.args.get('start'))
+            end = parse_day(request.args.get('end'), today)
+            if start is None:
+                return jsonify({'error': 'Missing start date'}), 400
+        else:
+            return jsonify({'error': 'Unknown period'}), 404
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+    
+    return jsonify(summary_report(start, end, request.args.get('owner')))
+
+def warm_shared_state():
+    """Build the read-mostly state every worker would otherwise build for itself on first use"""
+    with app.app_context():
+        table_registry.invalidate()
+        table_registry._load()  # Tables and their tariffs
+        db.session.remove()
+        db.engine.dispose()
+    load_pdf_reports()  # ReportLab and the prebuilt report styles
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+def create_app(preload=False):
+    """Gunicorn entry point (see gunicorn.conf.py)
+
+    Routes and extensions are bound to the module-level app at import. With
+    preload=True this runs once in the gunicorn master: it sets up the database
+    and builds the shared state before any worker is forked, so workers share
+    it copy-on-write instead of each loading its own.
+    """
+    if preload:
+        bootstrap_db()
+        warm_shared_state()
+        # Move everything built so far out of the collector's reach: a collection in
+        # a worker would otherwise write to these objects and copy their pages
+        gc.freeze()
+    return app
+
 if __name__ == '__main__':
-    init_db()  # Initialize the database
+    bootstrap_db()  # Create or upgrade the database, keeping its data
     print("Starting Flask application...")
     app.run(host='0.0.0.0', port=5000, debug=True)
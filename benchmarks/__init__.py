@@ -0,0 +1,19 @@
+"""Synthetic data and route benchmarks for Snooker Manager.
+
+Both scripts point the app at their own database through
+SQLALCHEMY_DATABASE_URI, so they never touch snooker.db:
+
+    python -m benchmarks.seed --games 200000 --seed 42
+    python -m benchmarks.run --output results/after.json --compare results/before.json
+"""
+import os
+
+DEFAULT_DATABASE = 'sqlite:///benchmark.db'
+
+
+def configure(database):
+    """Point the app at the benchmark database; must run before `import app`"""
+    os.environ['SQLALCHEMY_DATABASE_URI'] = database
+    # Keep background maintenance and slow-request logging out of the measurements
+    os.environ.setdefault('ACTIVITY_RETENTION_INTERVAL_HOURS', '0')
+    os.environ.setdefault('SLOW_REQUEST_SECONDS', '3600')
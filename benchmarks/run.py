@@ -0,0 +1,193 @@
+"""Drive the Flask routes against a seeded database and record how they perform.
+
+    python -m benchmarks.run --iterations 30 --output results/after.json --compare results/before.json
+
+Each route is called through Flask's test client: a few warm-up calls,
+then --iterations timed calls for p50/p95 latency and SQL statement count,
+then one extra call under tracemalloc for peak Python memory. Report routes
+are measured cold (report cache emptied before every call) and cached.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks import DEFAULT_DATABASE, configure
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='SQLAlchemy URL of the seeded database')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--only', nargs='*', help='route names to run (default: all)')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    return parser.parse_args()
+
+
+def login(m, username, password):
+    client = m.app.test_client()
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302, f"login failed for {username}"
+    return client
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_routes(m, admin, worker):
+    """(name, client, url, headers, before_each) for every benchmarked route"""
+    with m.app.app_context():
+        game = m.GameRecord.query.filter_by(state='inprogress').first()
+        debtor = m.db.session.query(m.GameRecord.customer_name).join(m.Table).filter(
+            m.Table.owner == 'ayoub',
+            m.GameRecord.payment_status == 'loan',
+            m.GameRecord.confirmed == True
+        ).group_by(m.GameRecord.customer_name).order_by(m.db.func.count().desc()).limit(1).scalar()
+
+    active_etag = admin.get('/api/active_games').headers.get('ETag')
+
+    def empty_report_cache():
+        shutil.rmtree(m.REPORT_CACHE_DIR, ignore_errors=True)
+        m.report_jobs.clear()
+
+    routes = [
+        ('admin_dashboard', admin, '/admin/dashboard', {}, None),
+        ('user_dashboard', worker, '/dashboard', {}, None),
+        ('active_games', admin, '/api/active_games', {}, None),
+        ('active_games_not_modified', admin, '/api/active_games', {'If-None-Match': active_etag}, None),
+        ('prices', worker, '/api/prices', {}, None),
+        ('activities_page', admin, '/api/activities?limit=50', {}, None),
+        ('summary_month', admin, '/admin/summary/month', {}, None),
+        ('daily_invoice_owner_cold', admin, '/admin/daily_invoice/ayoub', {}, empty_report_cache),
+        ('daily_invoice_all_cold', admin, '/admin/daily_invoice/all', {}, empty_report_cache),
+        ('daily_invoice_all_cached', admin, '/admin/daily_invoice/all', {}, None),
+    ]
+    if game:
+        routes.append(('get_price', worker, f'/get_price/{game.id}', {}, None))
+    if debtor:
+        routes.append(('invoice_cold', admin, f'/admin/invoice/ayoub/{debtor}', {}, empty_report_cache))
+        routes.append(('invoice_cached', admin, f'/admin/invoice/ayoub/{debtor}', {}, None))
+    return routes
+
+
+def measure(m, client, url, headers, before_each, iterations, warmup, statements):
+    def call():
+        if before_each:
+            before_each()
+        response = client.get(url, headers=headers)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+    for _ in range(warmup):
+        call()
+
+    latencies = []
+    queries = []
+    for _ in range(iterations):
+        statements[0] = 0
+        started = time.perf_counter()
+        status = call()
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(statements[0])
+
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    quantiles = statistics.quantiles(latencies, n=20) if len(latencies) > 1 else latencies * 19
+    return {
+        'status': status,
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(quantiles[18], 2),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'queries': round(statistics.median(queries), 1),
+        'peak_kb': round(peak / 1024, 1)
+    }
+
+
+def compare(results, baseline):
+    print(f"\n{'route':<28}{'p50 ms':>12}{'change':>10}{'p95 ms':>12}{'change':>10}{'queries':>14}")
+    for name, current in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if not before:
+            print(f"{name:<28}{current['p50_ms']:>12}{'new':>10}{current['p95_ms']:>12}{'':>10}{current['queries']:>14}")
+            continue
+        p50_change = (current['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+        p95_change = (current['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+        queries = f"{before['queries']:g} -> {current['queries']:g}"
+        print(f"{name:<28}{current['p50_ms']:>12}{p50_change:>+9.0f}%{current['p95_ms']:>12}{p95_change:>+9.0f}%{queries:>14}")
+
+
+def main():
+    args = parse_args()
+    configure(args.database)
+    import app as m
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    statements = [0]
+
+    def count_statement(*_):
+        statements[0] += 1
+
+    event.listen(Engine, 'before_cursor_execute', count_statement)
+    m.REPORT_CACHE_DIR = tempfile.mkdtemp(prefix='snooker-bench-reports-')
+
+    admin = login(m, 'admin', 'admin753159')
+    worker = login(m, 'ayoub', 'ayoub54321')
+    with m.app.app_context():
+        rows = {model.__tablename__: model.query.count()
+                for model in (m.GameRecord, m.GameRecordHistory, m.UserActivity, m.Table)}
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'database': args.database,
+            'python': platform.python_version(),
+            'iterations': args.iterations,
+            'rows': rows
+        },
+        'routes': {}
+    }
+
+    try:
+        for name, client, url, headers, before_each in build_routes(m, admin, worker):
+            if args.only and name not in args.only:
+                continue
+            result = measure(m, client, url, headers, before_each, args.iterations, args.warmup, statements)
+            results['routes'][name] = result
+            print(f"{name:<28} status {result['status']}  p50 {result['p50_ms']:>9.2f} ms  "
+                  f"p95 {result['p95_ms']:>9.2f} ms  queries {result['queries']:>6g}  peak {result['peak_kb']:>9.1f} KiB")
+    finally:
+        shutil.rmtree(m.REPORT_CACHE_DIR, ignore_errors=True)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
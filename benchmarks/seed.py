@@ -0,0 +1,164 @@
+"""Fill a scratch database with a realistic, reproducible club history.
+
+    python -m benchmarks.seed --games 200000 --customers 5000 --seed 42
+
+The schema is rebuilt from scratch (init_db), then tables, owners, games,
+archived games and activity log rows are bulk-inserted. Games from the last
+--live-days days stay in game_record, like a club that rarely presses
+reset_day; older ones are in game_record_history.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import DEFAULT_DATABASE, configure
+
+BATCH_SIZE = 10000
+ACTIONS = ['Logged in', 'Logged out', 'Started game', 'Ended game', 'Confirmed game', 'Processed loan payment']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='SQLAlchemy URL of the scratch database')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--games', type=int, default=200000)
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--extra-owners', type=int, default=4, help='owners besides ayoub and ayman')
+    parser.add_argument('--tables-per-owner', type=int, default=6)
+    parser.add_argument('--days', type=int, default=365, help='days of history to spread games over')
+    parser.add_argument('--live-days', type=int, default=30, help='recent days left unarchived')
+    parser.add_argument('--activities', type=int, default=300000)
+    return parser.parse_args()
+
+
+def insert_batches(m, model, rows):
+    """Bulk insert an iterable of column dicts, committing every BATCH_SIZE rows"""
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            m.db.session.execute(m.db.insert(model), batch)
+            m.db.session.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        m.db.session.execute(m.db.insert(model), batch)
+        m.db.session.commit()
+        total += len(batch)
+    return total
+
+
+def make_customers(rng, count):
+    """Customer names with a long-tailed visit frequency and a per-customer loan habit"""
+    names = [f"customer {i:05d}" for i in range(count)]
+    weights = [rng.paretovariate(1.2) for _ in names]
+    # A tenth of the regulars run long tabs; everyone else mostly pays on the spot
+    loan_rates = {name: 0.6 if rng.random() < 0.1 else 0.1 for name in names}
+    return names, weights, loan_rates
+
+
+def generate_games(rng, args, tables, customers, now):
+    names, weights, loan_rates = customers
+    live_since = now - timedelta(days=args.live_days)
+    game_id = 0
+
+    for _ in range(args.games):
+        table = rng.choice(tables)
+        day = now.date() - timedelta(days=rng.randrange(args.days))
+        start = datetime(day.year, day.month, day.day, rng.randrange(10, 23), rng.randrange(60))
+        minutes = rng.randrange(20, 180)
+        end = start + timedelta(minutes=minutes)
+        if end >= now:
+            continue
+        customer = rng.choices(names, weights)[0]
+        game_id += 1
+        row = {
+            'table_id': table.id,
+            'start_time': start,
+            'end_time': end,
+            'price': round(minutes / 60 * table.rate * 2) / 2,
+            'payment_status': 'loan' if rng.random() < loan_rates[customer] else 'paid',
+            'state': 'finished',
+            'customer_name': customer,
+            'created_by': table.owner,
+            'confirmed': start.date() < now.date() or rng.random() < 0.8
+        }
+        yield start >= live_since, game_id, row
+
+
+def generate_activities(rng, args, user_ids, now):
+    start = now - timedelta(days=args.days)
+    for _ in range(args.activities):
+        action = rng.choice(ACTIONS)
+        yield {
+            'user_id': rng.choice(user_ids),
+            'action': action,
+            'timestamp': start + timedelta(seconds=rng.randrange(args.days * 86400)),
+            'details': f"{action}: customer {rng.randrange(args.customers):05d}, amount {rng.randrange(10, 500)}"
+        }
+
+
+def main():
+    args = parse_args()
+    configure(args.database)
+    import app as m
+
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    started = time.perf_counter()
+    m.init_db()
+
+    with m.app.app_context():
+        owners = ['ayoub', 'ayman'] + [f"owner{i}" for i in range(1, args.extra_owners + 1)]
+        password_hash = m.User.query.filter_by(username='ayoub').one().password_hash
+        m.db.session.add_all(m.User(username=owner, password_hash=password_hash, role=owner)
+                             for owner in owners[2:])
+        m.db.session.add_all(m.Table(name=f"{owner} table {i}", owner=owner)
+                             for owner in owners for i in range(1, args.tables_per_owner + 1))
+        m.db.session.commit()
+
+        tables = m.Table.query.all()
+        for table in tables:
+            table.rate = rng.choice([20, 25, 30, 40])
+
+        live = []
+        archived = []
+        for is_live, game_id, row in generate_games(rng, args, tables, make_customers(rng, args.customers), now):
+            if is_live:
+                live.append(row)
+            else:
+                archived.append(dict(row, game_id=game_id, archived_at=row['end_time']))
+        # A game on the table right now for a third of the tables
+        for table in rng.sample(tables, len(tables) // 3):
+            live.append({
+                'table_id': table.id,
+                'start_time': now - timedelta(minutes=rng.randrange(5, 120)),
+                'price': 0,
+                'payment_status': 'loan',
+                'state': 'inprogress',
+                'created_by': table.owner,
+                'confirmed': False
+            })
+
+        counts = {
+            'game_record': insert_batches(m, m.GameRecord, live),
+            'game_record_history': insert_batches(m, m.GameRecordHistory, archived),
+        }
+        user_ids = [user.id for user in m.User.query.all()]
+        counts['user_activity'] = insert_batches(m, m.UserActivity, generate_activities(rng, args, user_ids, now))
+        counts['daily_summary_days'] = m.rebuild_daily_summaries()
+        counts['customer_balances'] = m.rebuild_customer_balances()
+        m.db.session.commit()
+        # Planner statistics, as a long-running database would have them
+        with m.db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('ANALYZE')
+
+    for name, count in counts.items():
+        print(f"{name:>22}: {count}")
+    print(f"Seeded {args.database} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Measure what a fresh worker pays to import the app, with and without ReportLab.
+
+    python -m benchmarks.startup --runs 10 --output results/startup.json --compare results/startup-before.json
+
+Every run is a new interpreter, like a freshly forked gunicorn worker without
+--preload. 'app' imports the app only. 'app_with_pdf' also imports the PDF
+renderers, which is what each worker paid up front before ReportLab was loaded
+lazily and is still what the first report in a worker costs.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+from benchmarks import DEFAULT_DATABASE
+from benchmarks.run import git_revision
+
+# Runs in the child interpreter; prints import seconds and peak RSS in KiB
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app
+if {with_pdf}:
+    app.load_pdf_reports()
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules)
+}}))
+"""
+
+SCENARIOS = {
+    'app': False,
+    'app_with_pdf': True,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=DEFAULT_DATABASE, help='SQLAlchemy URL the app is pointed at')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    return parser.parse_args()
+
+
+def probe(with_pdf, database):
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI=database)
+    output = subprocess.check_output([sys.executable, '-c', PROBE.format(with_pdf=with_pdf)],
+                                     env=env, text=True, cwd=os.path.dirname(os.path.dirname(__file__)) or '.')
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(with_pdf, runs, database):
+    samples = [probe(with_pdf, database) for _ in range(runs)]
+    return {
+        'import_ms_p50': round(statistics.median(sample['seconds'] for sample in samples) * 1000, 1),
+        'import_ms_max': round(max(sample['seconds'] for sample in samples) * 1000, 1),
+        'max_rss_mb': round(statistics.median(sample['max_rss_kb'] for sample in samples) / 1024, 1),
+        'modules': samples[-1]['modules']
+    }
+
+
+def compare(results, baseline):
+    print(f"\n{'scenario':<16}{'import ms':>12}{'change':>10}{'RSS MiB':>12}{'change':>10}")
+    for name, current in results['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if not before:
+            print(f"{name:<16}{current['import_ms_p50']:>12}{'new':>10}{current['max_rss_mb']:>12}")
+            continue
+        import_change = (current['import_ms_p50'] - before['import_ms_p50']) / before['import_ms_p50'] * 100
+        rss_change = (current['max_rss_mb'] - before['max_rss_mb']) / before['max_rss_mb'] * 100
+        print(f"{name:<16}{current['import_ms_p50']:>12}{import_change:>+9.0f}%"
+              f"{current['max_rss_mb']:>12}{rss_change:>+9.0f}%")
+
+
+def main():
+    args = parse_args()
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'runs': args.runs
+        },
+        'scenarios': {}
+    }
+
+    for name, with_pdf in SCENARIOS.items():
+        result = measure(with_pdf, args.runs, args.database)
+        results['scenarios'][name] = result
+        print(f"{name:<16} import p50 {result['import_ms_p50']:>8.1f} ms  max {result['import_ms_max']:>8.1f} ms  "
+              f"RSS {result['max_rss_mb']:>6.1f} MiB  modules {result['modules']}")
+
+    app_only, with_pdf = results['scenarios']['app'], results['scenarios']['app_with_pdf']
+    print(f"\nLazy ReportLab saves {with_pdf['import_ms_p50'] - app_only['import_ms_p50']:.1f} ms and "
+          f"{with_pdf['max_rss_mb'] - app_only['max_rss_mb']:.1f} MiB per worker that never renders a PDF")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
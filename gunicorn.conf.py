@@ -0,0 +1,55 @@
+"""Gunicorn settings, picked up from the working directory: run plain `gunicorn`.
+
+WEB_WORKER_CLASS   gthread (default) or gevent; app.py sizes its connection pool to match
+WEB_THREADS        request threads per gthread worker (default 16)
+WEB_CONCURRENCY    worker processes (default 1)
+WEB_PRELOAD        build the app and its shared state in the master before forking (default on)
+"""
+import os
+
+worker_class = os.getenv('WEB_WORKER_CLASS', 'gthread')
+if worker_class == 'gevent':
+    # Patch before the app is imported, or the locks it creates at import block the whole worker
+    from gevent import monkey
+    monkey.patch_all()
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()  # Let PostgreSQL queries yield to other greenlets
+    except ImportError:
+        pass
+
+threads = int(os.getenv('WEB_THREADS', 16))
+# gevent: simultaneous clients per worker; every open dashboard stream is one
+worker_connections = int(os.getenv('WEB_WORKER_CONNECTIONS', 1000))
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+preload_app = os.getenv('WEB_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+wsgi_app = 'app:create_app(preload=True)' if preload_app else 'app:create_app()'
+
+
+def on_starting(server):
+    # Runs once in the master, before any worker exists, so only one process migrates.
+    # A preloaded app has already done this in create_app.
+    if not server.cfg.preload_app:
+        from app import bootstrap_db
+        bootstrap_db()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        # Pooled connections must never be shared with the master; close=False leaves its sockets alone
+        from app import app, db
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Workers only confirm the schema is current instead of rebuilding it
+    from app import check_schema
+    check_schema()
+
+
+def when_ready(server):
+    if server.cfg.workers > 1:
+        server.log.warning("Live game streams, ETags and in-memory caches are per worker; "
+                           "with %s workers a change only reaches the dashboards of the worker "
+                           "that made it", server.cfg.workers)
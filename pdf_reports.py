@@ -0,0 +1,208 @@
+"""ReportLab rendering for the invoices and daily reports.
+
+app.py imports this module on first use (load_pdf_reports), so workers that
+never render a PDF don't pay for ReportLab. Style sheets and table styles are
+built once here, at import, instead of on every report.
+"""
+from datetime import datetime
+from itertools import islice
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import SimpleDocTemplate, Frame, LayoutError, Table as ReportTable, TableStyle, Paragraph
+from reportlab.lib.styles import getSampleStyleSheet
+
+STYLES = getSampleStyleSheet()
+
+# Invoice tables are cut into segments of about a page, each repeating the header, so
+# ReportLab never has to lay out one huge table
+INVOICE_ROWS_PER_TABLE = 25
+INVOICE_HEADER = ['Date', 'Table', 'Duration', 'Price', 'Status']
+# Fixed column widths keep the segments lined up with each other
+INVOICE_COLUMN_WIDTHS = [120, 90, 90, 100, 100]
+
+HEADER_COMMANDS = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 14),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+]
+BODY_COMMANDS = [
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 12),
+]
+GRID_COMMAND = ('GRID', (0, 0), (-1, -1), 1, colors.black)
+
+INVOICE_STYLE = TableStyle(HEADER_COMMANDS + BODY_COMMANDS + [
+    ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+    GRID_COMMAND
+])
+INVOICE_TOTALS_STYLE = TableStyle(HEADER_COMMANDS + BODY_COMMANDS + [
+    ('BACKGROUND', (0, -2), (-1, -1), colors.lightgrey),
+    ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+    GRID_COMMAND
+])
+DAILY_STYLE = TableStyle(HEADER_COMMANDS + [
+    ('BACKGROUND', (0, -4), (-1, -1), colors.beige),
+    ('TEXTCOLOR', (0, -4), (-1, -1), colors.black),
+    ('FONTNAME', (0, -4), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, -4), (-1, -1), 12),
+    ('ALIGN', (0, -4), (-1, -1), 'LEFT'),
+    GRID_COMMAND
+])
+DAILY_SECTION_STYLE = TableStyle(HEADER_COMMANDS + [
+    ('BACKGROUND', (0, -3), (-1, -1), colors.lightgrey),
+] + BODY_COMMANDS + [
+    ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+    GRID_COMMAND
+])
+GRAND_TOTAL_STYLE = TableStyle(HEADER_COMMANDS + BODY_COMMANDS + [GRID_COMMAND])
+
+
+def invoice_table(rows, total_paid=None, total_loan=None):
+    """One invoice table segment; the last one also carries the totals"""
+    data = [INVOICE_HEADER] + rows
+
+    # Add totals
+    if total_paid is not None:
+        data.append(['', '', '', 'Total Paid:', f"{total_paid:.2f} MAD"])
+        data.append(['', '', '', 'Total Loan:', f"{total_loan:.2f} MAD"])
+
+    table = ReportTable(data, colWidths=INVOICE_COLUMN_WIDTHS, repeatRows=1)
+    table.setStyle(INVOICE_STYLE if total_paid is None else INVOICE_TOTALS_STYLE)
+    return table
+
+
+def invoice_frame():
+    """The body frame of a page, placed like SimpleDocTemplate's (one inch margins)"""
+    return Frame(inch, inch, letter[0] - 2 * inch, letter[1] - 2 * inch)
+
+
+def build_page_by_page(output, flowables):
+    """Lay out flowables with the Frame API, pulling each from the iterator only when
+    the page before it is done, so only the current page's flowables are alive
+
+    This is still not constant memory: the canvas keeps every finished page's content
+    stream (about 10 KB a page) until it is saved, so memory grows with the page count.
+    """
+    canvas = Canvas(output, pagesize=letter)
+    frame = invoice_frame()
+    for flowable in flowables:
+        pending = [flowable]
+        while pending:
+            current = pending.pop(0)
+            if frame.add(current, canvas):
+                continue
+            # Whatever fits goes on this page, the rest (with the header row repeated) on the next
+            parts = frame.split(current, canvas)
+            if parts:
+                if not frame.add(parts[0], canvas):
+                    raise LayoutError(f"Could not place {parts[0].__class__.__name__} after splitting it")
+                pending[:0] = parts[1:]
+            else:
+                pending.insert(0, current)
+            canvas.showPage()
+            frame = invoice_frame()
+    canvas.save()
+
+
+def invoice_flowables(customer_name, rows, total_paid, total_loan, scope=None):
+    yield Paragraph(f"Invoice for {customer_name}", STYLES['Title'])
+    yield Paragraph(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M')}", STYLES['Normal'])
+    if scope:
+        yield Paragraph(scope, STYLES['Normal'])
+
+    rows = iter(rows)
+    segment = list(islice(rows, INVOICE_ROWS_PER_TABLE))
+    while True:
+        next_segment = list(islice(rows, INVOICE_ROWS_PER_TABLE))
+        if not next_segment:
+            yield invoice_table(segment, total_paid, total_loan)
+            return
+        yield invoice_table(segment)
+        segment = next_segment
+
+
+def render_invoice(output, customer_name, rows, total_paid, total_loan, scope=None):
+    """Render a customer invoice PDF to a file name or file object
+
+    rows can be any iterable (a database cursor, say); it is consumed one segment at a
+    time, as the pages are laid out.
+    """
+    build_page_by_page(output, invoice_flowables(customer_name, rows, total_paid, total_loan, scope))
+
+
+def render_daily_invoice(output, owner, date, rows, total_paid, total_loan):
+    """Render one owner's daily report PDF to a file name or file object"""
+    doc = SimpleDocTemplate(output, pagesize=letter)
+    elements = []
+
+    # Add title
+    title = Paragraph(f"Daily Report - {owner.capitalize()} - {date}", STYLES['Title'])
+    elements.append(title)
+
+    # Prepare data for the table
+    data = [['Table', 'Customer', 'Start Time', 'End Time', 'Duration', 'Price', 'Status']] + rows
+
+    # Add summary row
+    data.append(['', '', '', '', '', '', ''])
+    data.append(['Total Paid:', f"{total_paid:.2f} MAD", '', '', '', '', ''])
+    data.append(['Total Loan:', f"{total_loan:.2f} MAD", '', '', '', '', ''])
+    data.append(['Total:', f"{(total_paid + total_loan):.2f} MAD", '', '', '', '', ''])
+
+    # Create table
+    table = ReportTable(data)
+    table.setStyle(DAILY_STYLE)
+    elements.append(table)
+
+    # Build PDF
+    doc.build(elements)
+
+
+def render_daily_all_invoice(output, date, sections, total_all_paid, total_all_loan):
+    """Render the all-workers daily report PDF to a file name or file object"""
+    doc = SimpleDocTemplate(output, pagesize=letter)
+    elements = []
+
+    # Title
+    elements.append(Paragraph(f"Daily Report - All Workers", STYLES['Title']))
+    elements.append(Paragraph(f"Date: {date}", STYLES['Normal']))
+
+    # Report for each worker
+    for section in sections:
+        elements.append(Paragraph(f"\n{section['owner'].title()}'s Report", STYLES['Heading2']))
+
+        # Table data
+        data = [['Time', 'Table', 'Customer', 'Duration', 'Price', 'Status']] + section['rows']
+        total_paid = section['total_paid']
+        total_loan = section['total_loan']
+
+        # Add worker totals
+        data.append(['', '', '', '', 'Total Paid:', f"{total_paid:.2f} MAD"])
+        data.append(['', '', '', '', 'Total Loan:', f"{total_loan:.2f} MAD"])
+        data.append(['', '', '', '', 'Total:', f"{(total_paid + total_loan):.2f} MAD"])
+
+        # Create table
+        table = ReportTable(data)
+        table.setStyle(DAILY_SECTION_STYLE)
+
+        elements.append(table)
+        elements.append(Paragraph("<br/><br/>", STYLES['Normal']))
+
+    # Add grand total
+    elements.append(Paragraph("Grand Total", STYLES['Heading1']))
+    grand_total_data = [
+        ['', 'Total Paid', 'Total Loan', 'Total'],
+        ['All Workers', f"{total_all_paid:.2f} MAD", f"{total_all_loan:.2f} MAD", f"{(total_all_paid + total_all_loan):.2f} MAD"]
+    ]
+
+    grand_total_table = ReportTable(grand_total_data)
+    grand_total_table.setStyle(GRAND_TOTAL_STYLE)
+
+    elements.append(grand_total_table)
+    doc.build(elements)
@@ -0,0 +1,63 @@
+"""Shared fixtures: the app pointed at a scratch SQLite database, rebuilt for every test."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix='snooker-tests-')
+# app.py reads its configuration at import
+os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'test.db')}"
+os.environ['REPORT_CACHE_DIR'] = os.path.join(SCRATCH_DIR, 'reports')
+os.environ['ACTIVITY_LOG_SYNC'] = '1'
+os.environ['ACTIVITY_RETENTION_INTERVAL_HOURS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as snooker  # noqa: E402
+
+
+@pytest.fixture
+def m():
+    """The app module over an empty, freshly seeded database"""
+    snooker.init_db()
+    snooker.table_registry.invalidate()
+    snooker.customer_index.invalidate()
+    yield snooker
+    with snooker.app.app_context():
+        snooker.db.session.remove()
+
+
+@pytest.fixture
+def admin(m):
+    client = m.app.test_client()
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin753159'})
+    assert response.status_code == 302
+    return client
+
+
+def add_games(m, *games):
+    """Insert finished ayoub games from (customer, price, payment_status, confirmed, hours ago) tuples"""
+    from datetime import datetime, timedelta
+    now = datetime.now()
+    with m.app.app_context():
+        records = []
+        for customer_name, price, payment_status, confirmed, hours_ago in games:
+            start = now - timedelta(hours=hours_ago)
+            records.append(m.GameRecord(table_id=1, start_time=start, end_time=start + timedelta(minutes=30),
+                                        price=price, payment_status=payment_status, state='finished',
+                                        customer_name=customer_name, created_by='ayoub', confirmed=confirmed))
+        m.db.session.add_all(records)
+        m.db.session.commit()
+        return [record.id for record in records]
+
+
+def ledger(m, customer_name):
+    """(paid_total, loan_total, game_count) of an ayoub customer's balance"""
+    with m.app.app_context():
+        balance = m.CustomerBalance.query.filter_by(owner='ayoub', customer_name=customer_name).one()
+        return balance.paid_total, balance.loan_total, balance.game_count
+
+
+def mismatches(m):
+    with m.app.app_context():
+        return m.balance_mismatches()
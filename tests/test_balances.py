@@ -0,0 +1,52 @@
+"""The CustomerBalance ledger must always match what the game rows add up to."""
+import threading
+import time
+
+from conftest import add_games, ledger, mismatches
+
+
+def test_reprice_day_applies_to_the_ledger(m):
+    first, second = add_games(m, ('Omar', 0, 'loan', True, 3), ('Omar', 0, 'loan', True, 2))
+    with m.app.app_context():
+        day = m.db.session.get(m.GameRecord, first).start_time.strftime('%Y-%m-%d')
+
+    result = m.app.test_cli_runner().invoke(args=['reprice-day', '--day', day, '--apply'])
+
+    assert result.exit_code == 0, result.output
+    with m.app.app_context():
+        prices = [m.db.session.get(m.GameRecord, game_id).price for game_id in (first, second)]
+    assert all(prices)
+    assert ledger(m, 'Omar')[1] == sum(prices)
+    assert mismatches(m) == []
+
+
+def test_concurrent_confirmations(m, monkeypatch):
+    game_ids = add_games(m, ('Omar', 15, 'loan', False, 3), ('Omar', 20, 'loan', False, 2))
+    original = m.stored_balance_entries
+
+    def slow_stored_balance_entries(ids):
+        # Widen the window between reading the old balance and writing the new one
+        entries = original(ids)
+        time.sleep(0.2)
+        return entries
+
+    monkeypatch.setattr(m, 'stored_balance_entries', slow_stored_balance_entries)
+    errors = []
+
+    def confirm(game_id):
+        try:
+            with m.app.app_context():
+                m.db.session.get(m.GameRecord, game_id).confirmed = True
+                m.db.session.commit()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=confirm, args=(game_id,)) for game_id in game_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert ledger(m, 'Omar') == (0, 35, 2)
+    assert mismatches(m) == []
@@ -0,0 +1,29 @@
+"""Merging customer spellings into one customer each."""
+from conftest import add_games
+
+
+def backfilled_names(m):
+    with m.app.app_context():
+        m.backfill_customers()
+        m.db.session.commit()
+        return {customer.key: customer.name for customer in m.Customer.query.all()}
+
+
+def test_most_used_spelling_wins(m):
+    add_games(m, ('ali', 10, 'paid', True, 5), ('Ali', 10, 'paid', True, 4), ('ali', 10, 'paid', True, 3))
+    assert backfilled_names(m)['ali'] == 'ali'
+
+
+def test_tied_spellings_go_to_the_most_recent(m):
+    add_games(m, ('Ali', 10, 'paid', True, 5), ('ali', 10, 'paid', True, 1),
+              ('said', 10, 'paid', True, 5), ('Said', 10, 'paid', True, 1))
+    names = backfilled_names(m)
+    assert names['ali'] == 'ali'
+    assert names['said'] == 'Said'
+
+
+def test_width_variants_fold_into_the_plain_spelling(m):
+    add_games(m, ('Ｂob', 10, 'paid', True, 1), ('bob', 10, 'paid', True, 3), ('Bob', 10, 'paid', True, 5))
+    assert backfilled_names(m)['bob'] == 'Bob'
+    with m.app.app_context():
+        assert {name for (name,) in m.db.session.query(m.GameRecord.customer_name)} == {'Bob'}
@@ -0,0 +1,61 @@
+"""Invoices are laid out page by page, one table segment at a time."""
+import re
+from io import BytesIO
+
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate
+
+import pdf_reports
+
+
+def invoice_rows(count):
+    return ([f"2024-01-{day % 28 + 1:02d}", str(day % 8 + 1), '1.50', f"{day + 10.0:.2f}", 'paid']
+            for day in range(count))
+
+
+def page_count(pdf):
+    return len(re.findall(rb'/Type /Page\b', pdf))
+
+
+def test_multi_segment_invoice_pages_like_a_plain_build():
+    # 130 rows: six segments, the header row repeated wherever a segment breaks across pages
+    rows = 130
+    streamed = BytesIO()
+    pdf_reports.render_invoice(streamed, 'Omar', invoice_rows(rows), 1300.0, 0.0, 'January')
+
+    plain = BytesIO()
+    SimpleDocTemplate(plain, pagesize=letter).build(
+        list(pdf_reports.invoice_flowables('Omar', invoice_rows(rows), 1300.0, 0.0, 'January')))
+
+    assert streamed.getvalue().startswith(b'%PDF')
+    assert page_count(streamed.getvalue()) == page_count(plain.getvalue()) == 5
+
+
+def test_rows_are_pulled_as_pages_fill(monkeypatch):
+    pulled = []
+    pulled_at_page_end = []
+
+    def rows():
+        for row in invoice_rows(200):
+            pulled.append(row)
+            yield row
+
+    show_page = pdf_reports.Canvas.showPage
+
+    def record_page(canvas):
+        pulled_at_page_end.append(len(pulled))
+        show_page(canvas)
+
+    monkeypatch.setattr(pdf_reports.Canvas, 'showPage', record_page)
+    pdf_reports.render_invoice(BytesIO(), 'Omar', rows(), 2000.0, 0.0)
+
+    assert len(pulled) == 200
+    # A page is finished while at most the next two segments have been read ahead of it
+    assert pulled_at_page_end[0] <= 3 * pdf_reports.INVOICE_ROWS_PER_TABLE
+    assert all(later >= earlier for earlier, later in zip(pulled_at_page_end, pulled_at_page_end[1:]))
+
+
+def test_empty_invoice_still_renders_its_totals():
+    output = BytesIO()
+    pdf_reports.render_invoice(output, 'Omar', [], 0.0, 0.0)
+    assert page_count(output.getvalue()) == 1
@@ -0,0 +1,17 @@
+"""The Prometheus exposition at /admin/metrics."""
+
+
+def test_activity_log_totals_are_counters(m, admin):
+    text = admin.get('/admin/metrics').get_data(as_text=True)
+    types = dict(line.split()[2:4] for line in text.splitlines() if line.startswith('# TYPE snooker_activity_log'))
+
+    assert types == {
+        'snooker_activity_log_pending': 'gauge',
+        'snooker_activity_log_written_total': 'counter',
+        'snooker_activity_log_dropped_total': 'counter',
+        'snooker_activity_log_failed_flushes_total': 'counter',
+        'snooker_activity_log_max_delay_seconds': 'gauge',
+    }
+    # Every declared metric has its sample
+    for name in types:
+        assert any(line.startswith(f'{name} ') for line in text.splitlines())
@@ -0,0 +1,28 @@
+"""Loan payments settle games oldest first and keep the balance ledger in step."""
+from conftest import add_games, ledger, mismatches
+
+
+def test_partial_loan_payment(m, admin):
+    add_games(m, ('Omar', 10, 'loan', True, 3), ('Omar', 10, 'loan', True, 2))
+
+    response = admin.post('/admin/pay_loan', json={'owner': 'ayoub', 'customer_name': 'Omar', 'amount': 15})
+
+    assert response.status_code == 200
+    assert response.get_json()['applied'] == 15
+    # The second game is split into a paid 5 and a loan 5
+    assert ledger(m, 'Omar') == (15, 5, 3)
+    assert mismatches(m) == []
+
+
+def test_partial_payments_in_one_batch(m, admin):
+    add_games(m, ('Omar', 10, 'loan', True, 3), ('Omar', 10, 'loan', True, 2), ('Said', 30, 'loan', True, 1))
+
+    response = admin.post('/admin/pay_loans', json={'payments': [
+        {'owner': 'ayoub', 'customer_name': 'Omar', 'amount': 4},
+        {'owner': 'ayoub', 'customer_name': 'Said', 'amount': 12.5},
+    ]})
+
+    assert response.status_code == 200, response.get_json()
+    assert ledger(m, 'Omar') == (4, 16, 3)
+    assert ledger(m, 'Said') == (12.5, 17.5, 2)
+    assert mismatches(m) == []
@@ -0,0 +1,19 @@
+"""Running prices follow the tariff while a game is on the table."""
+from datetime import datetime, timedelta
+
+
+def test_prices_cover_every_active_game_seen_by_the_dashboard(m, admin):
+    with m.app.app_context():
+        game = m.GameRecord(table_id=3, start_time=datetime.now() - timedelta(hours=2), created_by='ayman')
+        m.db.session.add(game)
+        m.db.session.commit()
+        game_id = game.id
+
+    active = {game['id']: game for game in admin.get('/api/active_games').get_json()}
+    prices = {game['id']: game['price'] for game in admin.get('/api/prices').get_json()}
+
+    # The admin dashboard refreshes running_price from /api/prices by game id
+    assert set(prices) == set(active) == {game_id}
+    assert prices[game_id] > 0
+    # Both are priced as of their own request, at most a price step apart
+    assert abs(prices[game_id] - active[game_id]['running_price']) <= m.PRICE_STEP
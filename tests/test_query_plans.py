@@ -0,0 +1,26 @@
+"""uses_index must reject full scans, including ones that go through an index."""
+import pytest
+
+import app as snooker
+
+CONSTANT = {'archived'}
+
+
+@pytest.mark.parametrize('plan, expected', [
+    (['SCAN table', 'SEARCH game_record USING INDEX ix_game_record_table_day (table_id=?)'], True),
+    (['SCAN game_record'], False),
+    # A leading equality on a column with one value matches every row
+    (['SCAN table', 'SEARCH game_record USING INDEX ix_game_record_day (archived=?)'], False),
+    (['Nested Loop',
+      '  ->  Index Scan using ix_game_record_table_day on game_record',
+      '        Index Cond: (table_id = "table".id)',
+      '  ->  Index Scan using table_pkey on "table"',
+      '        Index Cond: (archived = false)'], True),
+    (['Seq Scan on game_record'], False),
+    (['Index Scan using ix_game_record_day on game_record', '  Index Cond: (archived = false)'], False),
+    (['Bitmap Heap Scan on game_record',
+      '  ->  Bitmap Index Scan on ix_game_record_day',
+      '        Index Cond: (archived = false)'], False),
+])
+def test_uses_index(plan, expected):
+    assert snooker.uses_index(plan, constant=CONSTANT) is expected
@@ -0,0 +1,43 @@
+"""Report links answer at once and hand the file over when it is rendered."""
+import threading
+
+
+def test_plain_link_redirects_to_a_download_that_waits_for_the_render(m, admin):
+    release = threading.Event()
+
+    def render(output, text):
+        assert release.wait(10)
+        output.write(text.encode())
+
+    with m.app.test_request_context('/admin/invoice/daily'):
+        response = m.report_response('slow', render, {'text': '%PDF slow'}, 'slow.pdf')
+        key = m.report_key('slow', {'text': '%PDF slow'})
+        download_url = m.url_for('download_report', job_id=key)
+    # Answered while the render is still blocked
+    assert response.status_code == 303
+    assert response.location == download_url
+
+    pending = admin.get(download_url)
+    assert pending.status_code == 202
+    assert pending.get_json()['status'] == 'pending'
+    assert pending.headers['Refresh'] == pending.headers['Retry-After'] == str(m.REPORT_RETRY_SECONDS)
+
+    release.set()
+    m.report_jobs[key]['future'].result(timeout=10)
+    ready = admin.get(download_url)
+    assert ready.status_code == 200
+    assert ready.data == b'%PDF slow'
+    assert 'slow.pdf' in ready.headers['Content-Disposition']
+
+
+def test_failed_render_is_reported_on_the_download_link(m, admin):
+    def render(output):
+        raise ValueError('no rows')
+
+    with m.app.test_request_context('/admin/invoice/daily?async=1'):
+        body, status = m.report_response('broken', render, {}, 'broken.pdf')
+    m.report_jobs[body.get_json()['job_id']]['future'].exception(timeout=10)
+
+    failed = admin.get(body.get_json()['download_url'])
+    assert failed.status_code == 500
+    assert failed.get_json()['error'] == 'no rows'
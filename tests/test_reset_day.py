@@ -0,0 +1,33 @@
+"""reset_day moves every closed, confirmed game out of the live table."""
+from conftest import add_games
+
+
+def test_reset_day_archives_earlier_days(m, admin):
+    yesterday, today, unconfirmed = add_games(m, ('Omar', 30, 'paid', True, 30), ('Omar', 20, 'loan', True, 0.5),
+                                              ('Said', 10, 'loan', False, 0.5))
+    with m.app.app_context():
+        m.db.session.add(m.GameRecord(table_id=2, created_by='ayoub'))  # Still on the table
+        m.db.session.commit()
+
+    response = admin.post('/admin/reset_day')
+
+    assert response.status_code == 200
+    assert response.get_json()['archived'] == 2
+    with m.app.app_context():
+        archived = {game.game_id for game in m.GameRecordHistory.query}
+        live = {game.id for game in m.GameRecord.query}
+    assert archived == {yesterday, today}
+    assert unconfirmed in live and len(live) == 2
+
+
+def test_reset_day_rolls_up_every_archived_day(m, admin):
+    yesterday, today = add_games(m, ('Omar', 30, 'paid', True, 30), ('Omar', 20, 'loan', True, 0.5))
+    with m.app.app_context():
+        days = [m.db.session.get(m.GameRecord, game_id).start_time.date() for game_id in (yesterday, today)]
+
+    admin.post('/admin/reset_day')
+    summary = admin.get(f'/admin/summary/range?start={days[0]}&end={days[1]}').get_json()
+
+    assert summary['total_paid'] == 30
+    assert summary['total_loan'] == 20
+    assert sorted(day['day'] for day in summary['days']) == sorted({day.isoformat() for day in days})